@@ -0,0 +1,133 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from pandasai import SmartDataframe
+from pandasai_openai import OpenAI
+
+from backend.coalesce import KeyedLocks
+from backend.http_client import openai_client
+
+# --- CONFIG ---
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "32"))
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gpt-4o-mini")
+
+
+class AgentPool:
+    """SmartDataframe agents keyed by file version, sharing one LLM client.
+
+    An agent is cached under (file id, data fingerprint), so a refreshed file gets a
+    new agent while unchanged files keep theirs across requests; building a newer
+    version drops the older ones. All agents share a single LLM client and with it
+    one HTTP connection pool. The least recently used agents beyond AGENT_POOL_SIZE
+    are dropped.
+    """
+
+    def __init__(self, max_agents: int):
+        self.max_agents = max_agents
+        self._agents: "OrderedDict[Tuple[str, str], SmartDataframe]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One build per file version; concurrent first requests wait for it instead of building twice
+        self._builds = KeyedLocks()
+        self._llm = None
+        self.hits = 0
+        self.misses = 0
+        self.warmups = 0
+        self.evictions = 0
+
+    def llm(self):
+        with self._lock:
+            if self._llm is None:
+                self._llm = OpenAI(api_token=os.getenv("OPENAI_API_KEY"), model=AGENT_MODEL)
+                # Route completions through the process-wide pooled client
+                self._llm.client = openai_client().chat.completions
+            return self._llm
+
+    @staticmethod
+    def _key(file_info: Dict[str, Any]) -> Tuple[str, str]:
+        return str(file_info["id"]), file_info["fingerprint"]
+
+    def _build(self, file_info: Dict[str, Any]) -> SmartDataframe:
+        print(f"🤖 Initializing new SmartDataframe Agent for {file_info['filename']}...")
+        return SmartDataframe(file_info["df"], config={
+            "llm": self.llm(),
+            "save_charts": False,
+            "open_charts": False,
+            "enable_cache": True,
+            "custom_whitelisted_dependencies": ["json"]
+        })
+
+    def _lookup(self, key: Tuple[str, str]):
+        with self._lock:
+            sdf = self._agents.get(key)
+            if sdf is not None:
+                self._agents.move_to_end(key)
+                self.hits += 1
+                print("⚡ Reusing cached SmartDataframe Agent")
+            return sdf
+
+    def get(self, file_info: Dict[str, Any]) -> SmartDataframe:
+        """The agent for the file's loaded version, building it on first use."""
+        key = self._key(file_info)
+        sdf = self._lookup(key)
+        if sdf is not None:
+            return sdf
+
+        with self._builds.hold(key):
+            # Built by a concurrent request while we waited
+            sdf = self._lookup(key)
+            if sdf is not None:
+                return sdf
+            with self._lock:
+                self.misses += 1
+            sdf = self._build(file_info)
+            with self._lock:
+                # Older versions of this file can never be asked again
+                for stale in [k for k in self._agents if k[0] == key[0] and k != key]:
+                    del self._agents[stale]
+                self._agents[key] = sdf
+                while len(self._agents) > self.max_agents:
+                    self._agents.popitem(last=False)
+                    self.evictions += 1
+                return sdf
+
+    def warm(self, file_info: Dict[str, Any]) -> SmartDataframe:
+        """Builds the agent and precomputes its schema state locally, without an LLM call.
+
+        The table schema, head sample and serialized table that go into every prompt are
+        computed here, and one prompt is rendered to load the templates, so the first
+        question only pays for the LLM round trip.
+        """
+        sdf = self.get(file_info)
+        sdf.head_csv
+        sdf.dataframe.serialize_dataframe()
+        try:
+            from pandasai.core.prompts import get_chat_prompt_for_sql
+            get_chat_prompt_for_sql(sdf._agent._state).to_string()
+        except Exception as e:
+            # Internal API; the agent is usable without it
+            print(f"Warning: Prompt prewarm skipped: {e}")
+        with self._lock:
+            self.warmups += 1
+        return sdf
+
+    def discard(self, file_id: Any):
+        """Drops every cached agent of a file (deleted, or its DataFrame was evicted)."""
+        with self._lock:
+            for key in [k for k in self._agents if k[0] == str(file_id)]:
+                del self._agents[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "agents": len(self._agents),
+                "max_agents": self.max_agents,
+                "hits": self.hits,
+                "misses": self.misses,
+                "warmups": self.warmups,
+                "evictions": self.evictions,
+            }
+
+
+agent_pool = AgentPool(AGENT_POOL_SIZE)
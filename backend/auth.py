@@ -1,11 +1,17 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
-from backend.database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from backend.database import get_async_session
 from backend.models import User
 import os
 
@@ -13,8 +19,13 @@ import os
 SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey_change_me_in_prod")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 525600 # 1 Year (Indefinite Login)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different work factor are flagged by `needs_update` and upgraded on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
 # --- HASHING ---
@@ -24,6 +35,27 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL, so a few threads hash in parallel while the event loop keeps serving
+_hash_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def _verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False, None
+    if pwd_context.needs_update(hashed_password):
+        return True, pwd_context.hash(plain_password)
+    return True, None
+
+async def hash_password_async(password) -> str:
+    """`get_password_hash` on the bounded bcrypt pool, off the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, get_password_hash, password)
+
+async def verify_password_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verifies on the bcrypt pool. Returns (valid, new hash if the stored one is outdated else None)."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, _verify_and_update, plain_password, hashed_password)
+
+def shutdown():
+    _hash_pool.shutdown(wait=False, cancel_futures=True)
+
 # --- JWT ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -36,23 +68,118 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# --- AUTH CACHE ---
+class AuthCache:
+    """TTL + LRU caches of verified token claims and of the users they resolve to.
+
+    A repeated token skips the HMAC check and the user lookup. Claims are never kept
+    past the token's own `exp`, and `invalidate_user` drops a user whose record
+    changed so the next request reloads it.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._tokens: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._users: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+        self.invalidations = 0
+
+    def _get(self, entries: OrderedDict, key: str):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return entry[1]
+
+    def _put(self, entries: OrderedDict, key: str, value: Any, expires_at: float):
+        entries[key] = (expires_at, value)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def claims(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._get(self._tokens, token)
+            if payload is None:
+                self.token_misses += 1
+            else:
+                self.token_hits += 1
+            return payload
+
+    def remember_claims(self, token: str, payload: Dict[str, Any]):
+        expires_at = time.time() + self.ttl
+        if payload.get("exp") is not None:
+            expires_at = min(expires_at, float(payload["exp"]))
+        with self._lock:
+            self._put(self._tokens, token, payload, expires_at)
+
+    def user(self, email: str) -> Optional[User]:
+        with self._lock:
+            user = self._get(self._users, email)
+            if user is None:
+                self.user_misses += 1
+            else:
+                self.user_hits += 1
+            return user
+
+    def remember_user(self, user: User):
+        with self._lock:
+            self._put(self._users, user.email, user, time.time() + self.ttl)
+
+    def invalidate_user(self, email: str):
+        with self._lock:
+            if self._users.pop(email, None) is not None:
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "tokens": len(self._tokens),
+                "users": len(self._users),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "token_hits": self.token_hits,
+                "token_misses": self.token_misses,
+                "user_hits": self.user_hits,
+                "user_misses": self.user_misses,
+                "invalidations": self.invalidations,
+            }
+
+
+auth_cache = AuthCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
 # --- DEPENDENCY ---
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
+async def get_current_user(token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    payload = auth_cache.claims(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise credentials_exception
-    except JWTError:
+        auth_cache.remember_claims(token, payload)
+    email: str = payload.get("sub")
+    if email is None:
         raise credentials_exception
-        
+
+    user = auth_cache.user(email)
+    if user is not None:
+        return user
     statement = select(User).where(User.email == email)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     if user is None:
         raise credentials_exception
+    auth_cache.remember_user(user)
     return user
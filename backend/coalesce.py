@@ -0,0 +1,93 @@
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+
+class KeyedLocks:
+    """One re-entrant lock per key (e.g. a file id), created on demand and dropped when unused.
+
+    Lets requests on different files proceed in parallel while requests on the same file
+    take turns for loading and rebuilding it.
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, List[Any]] = {}  # key -> [RLock, holders + waiters]
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+
+    @contextmanager
+    def hold(self, key: Hashable):
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.RLock(), 0])
+            entry[1] += 1
+        lock = entry[0]
+        if not lock.acquire(blocking=False):
+            with self._lock:
+                self.contended += 1
+            lock.acquire()
+        try:
+            with self._lock:
+                self.acquisitions += 1
+            yield
+        finally:
+            lock.release()
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"held": len(self._locks), "acquisitions": self.acquisitions, "contended": self.contended}
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls: the first caller runs, the others wait for its result.
+
+    Only calls that overlap in time are merged; once the leader finishes the key is free
+    again (repeats after that are the result cache's job). A leader's exception is raised
+    to every caller waiting on it.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Returns (result, shared), where `shared` is True if another caller's run was reused."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._flights[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._flights), "leaders": self.leaders, "coalesced": self.coalesced}
+
+
+# Loading, reloading and profiling of one file at a time
+file_locks = KeyedLocks()
+# Identical questions on the same data version share one analysis (and LLM call)
+query_flights = SingleFlight()
@@ -0,0 +1,80 @@
+import os
+from typing import Optional
+
+import pandas as pd
+
+# --- CONFIG ---
+COLUMNAR_CACHE = os.getenv("COLUMNAR_CACHE", "1") == "1"
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def columnar_path(source_path: str) -> str:
+    """Location of the sanitized Parquet copy that sits next to an uploaded file."""
+    return f"{source_path}.parquet"
+
+
+def is_fresh(source_path: str) -> bool:
+    """True if a columnar copy exists and is at least as new as its source file."""
+    cache_path = columnar_path(source_path)
+    if not os.path.exists(cache_path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(cache_path) >= os.path.getmtime(source_path)
+
+
+def read_columnar(source_path: str) -> Optional[pd.DataFrame]:
+    """Memory-maps the Parquet copy of `source_path`, or returns None if it is missing/stale."""
+    if not (COLUMNAR_CACHE and HAS_PYARROW) or not is_fresh(source_path):
+        return None
+    try:
+        return pd.read_parquet(columnar_path(source_path), engine="pyarrow", memory_map=True)
+    except Exception as e:
+        print(f"Warning: Columnar cache unreadable, falling back to source: {e}")
+        return None
+
+
+def preview_columnar(source_path: str, rows: int = 5) -> Optional[pd.DataFrame]:
+    """First `rows` rows of the Parquet copy, read without loading the rest of the file."""
+    if not (COLUMNAR_CACHE and HAS_PYARROW) or not is_fresh(source_path):
+        return None
+    import pyarrow.parquet as pq
+    try:
+        parquet_file = pq.ParquetFile(columnar_path(source_path))
+        batch = next(parquet_file.iter_batches(batch_size=rows), None)
+        if batch is None:
+            return parquet_file.schema_arrow.empty_table().to_pandas()
+        return batch.to_pandas()
+    except Exception as e:
+        print(f"Warning: Columnar cache unreadable, falling back to source: {e}")
+        return None
+
+
+def write_columnar(df: pd.DataFrame, source_path: str):
+    """Writes a typed Parquet copy of an already sanitized DataFrame next to its source."""
+    if not (COLUMNAR_CACHE and HAS_PYARROW):
+        return
+    cache_path = columnar_path(source_path)
+    tmp_path = cache_path + ".tmp"
+    try:
+        df.to_parquet(tmp_path, engine="pyarrow", index=False)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        # Mixed-type object columns can't always be typed; the source file still works
+        print(f"Warning: Could not write columnar cache for {source_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def remove_columnar(source_path: str):
+    cache_path = columnar_path(source_path)
+    if os.path.exists(cache_path):
+        try:
+            os.remove(cache_path)
+        except OSError as e:
+            print(f"Warning: Could not delete columnar cache: {e}")
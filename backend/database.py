@@ -1,6 +1,11 @@
 from sqlmodel import SQLModel, create_engine, Session
-from typing import Generator
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from typing import AsyncGenerator, Generator
 import os
+import time
 
 # Create the database in the backend directory
 sqlite_file_name = "database_v2.db"
@@ -8,9 +13,99 @@ sqlite_file_name = "database_v2.db"
 base_dir = os.path.dirname(os.path.abspath(__file__))
 sqlite_url = f"sqlite:///{os.path.join(base_dir, sqlite_file_name)}"
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+# Any SQLAlchemy URL works (e.g. postgresql://... with postgresql+asyncpg://... for async)
+DATABASE_URL = os.getenv("DATABASE_URL", sqlite_url)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
+
+# --- CONFIG ---
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    """Per-connection SQLite tuning.
+
+    WAL lets readers run alongside the single writer instead of queueing behind it, and
+    synchronous=NORMAL is durable in WAL mode except for the last commits on power loss.
+    The busy timeout makes a second writer wait for the lock rather than fail at once.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+def _engine_options(url: str) -> dict:
+    options = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+    return options
+
+
+def make_engine(url: str = DATABASE_URL):
+    """Engine with a sized connection pool (and the tuned pragmas on SQLite)."""
+    db_engine = create_engine(url, **_engine_options(url))
+    if url.startswith("sqlite"):
+        event.listen(db_engine, "connect", _apply_pragmas)
+    return db_engine
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL):
+    """Async counterpart of `make_engine` (aiosqlite by default) for the async routes."""
+    db_engine = create_async_engine(url, **_engine_options(url))
+    if url.startswith("sqlite"):
+        # Pragmas run on the DBAPI connection the async driver wraps
+        event.listen(db_engine.sync_engine, "connect", _apply_pragmas)
+    return db_engine
+
+
+def ensure_indexes(db_engine):
+    """Lightweight migration: creates indexes declared on the models that an existing database lacks.
+
+    `create_all` only creates missing tables, so indexes added to a model later would
+    never reach databases created before them.
+    """
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db_engine, checkfirst=True)
+
+
+def init_db(db_engine, attempts: int = 5):
+    """Creates missing tables and indexes. Safe when several worker processes start at once.
+
+    Workers racing on a fresh database can hit "already exists" between the existence
+    check and CREATE; the retry then sees the other worker's tables and skips them.
+    """
+    for attempt in range(attempts):
+        try:
+            SQLModel.metadata.create_all(db_engine)
+            ensure_indexes(db_engine)
+            return
+        except OperationalError as e:
+            if "already exists" not in str(e) or attempt == attempts - 1:
+                raise
+            time.sleep(0.1 * (attempt + 1))
+
+
+engine = make_engine()
+async_engine = make_async_engine()
+async_session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    """Session dependency for `async def` routes; DB I/O is awaited instead of blocking the loop."""
+    async with async_session_factory() as session:
+        yield session
@@ -0,0 +1,138 @@
+import math
+import re
+from typing import Any, Dict, List
+
+import pandas as pd
+
+PROFILE_VERSION = 1
+TOP_VALUES = 3
+
+
+def detect_domain_context(columns: List[str]) -> str:
+    cols = " ".join([str(c).lower() for c in columns])
+    if any(x in cols for x in ['sales', 'revenue', 'profit', 'cost', 'qty']):
+        return "Retail/Sales Context. Focus on: Revenue trends, Top selling products, Profit margins."
+    elif any(x in cols for x in ['student', 'marks', 'grade', 'attendance', 'subject']):
+        return "Education Context. Focus on: Student performance, Pass/Fail rates, Subject averages."
+    elif any(x in cols for x in ['employee', 'salary', 'dept', 'hiring']):
+        return "HR Context. Focus on: Headcount, Salary distribution, Attrition."
+    else:
+        return "General Data Analysis Context. Focus on patterns and outliers."
+
+
+def detect_wide_format_dates(columns: List[str]) -> bool:
+    """True when more than 30% of the column headers are themselves dates (e.g. one column per month)."""
+    total_cols = len(columns)
+    if total_cols < 2:
+        return False
+    # Only headers containing a digit can parse as a date; everything else is rejected up front
+    names = pd.Series([str(c) for c in columns])
+    candidates = names[names.str.contains(r"\d", regex=True)]
+    if candidates.empty:
+        return False
+    parsed = pd.to_datetime(candidates, errors="coerce", format="mixed")
+    return (parsed.notna().sum() / total_cols) > 0.3
+
+
+def _scalar(value: Any) -> Any:
+    """JSON-safe Python scalar for profile storage."""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and (math.isnan(value) or math.isinf(value)):
+        return None
+    if not isinstance(value, (int, float, bool, str)):
+        return str(value)
+    return value
+
+
+def _column_profile(series: pd.Series) -> Dict[str, Any]:
+    nulls = int(series.isna().sum())
+    info = {
+        "name": str(series.name),
+        "dtype": str(series.dtype),
+        "nulls": nulls,
+        "cardinality": int(series.nunique(dropna=True)),
+        "min": None,
+        "max": None,
+    }
+    is_bool = pd.api.types.is_bool_dtype(series.dtype)
+    if not is_bool and (pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype)):
+        if nulls < len(series):
+            info["min"] = _scalar(series.min())
+            info["max"] = _scalar(series.max())
+    else:
+        top = series.value_counts(dropna=True).head(TOP_VALUES)
+        info["top_values"] = [_scalar(v) for v in top.index]
+    return info
+
+
+def build_profile(df: pd.DataFrame) -> Dict[str, Any]:
+    """Schema summary computed once per dataset version and reused by the prompt and /files/{id}/profile."""
+    columns = [str(c) for c in df.columns]
+    date_columns = [str(c) for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c].dtype)]
+    return {
+        "version": PROFILE_VERSION,
+        "rows": int(len(df)),
+        "columns": [_column_profile(df[c]) for c in df.columns],
+        "date_columns": date_columns,
+        "is_wide_format": bool(detect_wide_format_dates(columns)),
+        "domain_context": detect_domain_context(columns),
+    }
+
+
+# Integer columns are only keys when named like identifiers or date parts; others are measures
+_ID_NAME = re.compile(r"(?:^|[\s_\-.])(?:id|key|code|no|num|number)$|^(?:year|quarter|month|week|day)$", re.I)
+_CAMEL_ID = re.compile(r"[a-z](?:Id|ID)$")
+
+
+def _key_kind(column: Dict[str, Any]) -> Any:
+    """Join-compatible kind of a profiled column; floats, booleans and integer measures are not keys."""
+    dtype = column["dtype"]
+    if dtype.startswith(("int", "uint", "Int", "UInt")):
+        return "number" if _ID_NAME.search(column["name"]) or _CAMEL_ID.search(column["name"]) else None
+    if dtype.startswith("datetime"):
+        return "date"
+    if dtype in ("object", "string", "category", "str"):
+        return "text"
+    return None
+
+
+def _key_name(name: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", name.lower())
+
+
+def infer_join_keys(left: Dict[str, Any], right: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Candidate join keys between two profiled datasets: same column name, same key kind.
+
+    Only identifier- and dimension-like columns qualify (text, dates, integer ids); numeric
+    measures such as Sales or Profit share names across files without being keys.
+
+    Each candidate carries the relationship implied by the column cardinalities and an
+    estimate of the joined row count (rows_l * rows_r / max(distinct values)).
+    """
+    right_cols = {_key_name(c["name"]): c for c in right["columns"]}
+    keys = []
+    for lc in left["columns"]:
+        rc = right_cols.get(_key_name(lc["name"]))
+        kind = _key_kind(lc)
+        if rc is None or kind is None or kind != _key_kind(rc):
+            continue
+        left_unique = lc["cardinality"] >= left["rows"] - lc["nulls"]
+        right_unique = rc["cardinality"] >= right["rows"] - rc["nulls"]
+        relationship = {
+            (True, True): "one-to-one", (False, True): "many-to-one",
+            (True, False): "one-to-many", (False, False): "many-to-many",
+        }[(left_unique, right_unique)]
+        keys.append({
+            "left": lc["name"],
+            "right": rc["name"],
+            "relationship": relationship,
+            "estimated_rows": int(left["rows"] * right["rows"] / max(lc["cardinality"], rc["cardinality"], 1)),
+        })
+    # Keys that look like real identifiers first
+    keys.sort(key=lambda k: (k["relationship"] == "many-to-many", k["estimated_rows"]))
+    return keys
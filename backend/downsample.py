@@ -0,0 +1,145 @@
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# --- CONFIG ---
+CHART_MAX_LINE_POINTS = int(os.getenv("CHART_MAX_LINE_POINTS", "500"))
+CHART_MAX_BARS = int(os.getenv("CHART_MAX_BARS", "50"))
+CHART_MAX_PIE_SLICES = int(os.getenv("CHART_MAX_PIE_SLICES", "8"))
+CHART_SCATTER_BINS = int(os.getenv("CHART_SCATTER_BINS", "40"))
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that keep the line's shape.
+
+    The first and last points are always kept; every bucket in between contributes the
+    point forming the largest triangle with the previous pick and the next bucket's mean.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    picked = np.empty(threshold, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean() if next_end > end else x[-1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        picked[i + 1] = a
+    return picked
+
+
+def _axis_values(values: pd.Series) -> Optional[np.ndarray]:
+    """Numeric positions for an x axis of numbers or dates; None for categories."""
+    numeric = pd.to_numeric(values, errors="coerce")
+    if numeric.notna().all():
+        return numeric.to_numpy(dtype=float)
+    dates = pd.to_datetime(values, errors="coerce", format="mixed")
+    if dates.notna().all():
+        return dates.astype("int64").to_numpy(dtype=float)
+    return None
+
+
+def _line(frame: pd.DataFrame, x_key: str, y_key: str) -> Optional[pd.DataFrame]:
+    if len(frame) <= CHART_MAX_LINE_POINTS:
+        return None
+    x = _axis_values(frame[x_key])
+    if x is None:
+        x = np.arange(len(frame), dtype=float)  # ordered categories: use their position
+    y = pd.to_numeric(frame[y_key], errors="coerce").fillna(0).to_numpy(dtype=float)
+    return frame.iloc[lttb_indices(x, y, CHART_MAX_LINE_POINTS)]
+
+
+def _top_n(frame: pd.DataFrame, x_key: str, y_key: str, limit: int, other: bool) -> Optional[pd.DataFrame]:
+    """The `limit` largest categories, in their original order.
+
+    With `other` the long tail is summed into one "Other" bucket instead, which only
+    means something for parts of a whole (pie slices); summing the tail of e.g. an
+    average-per-category bar would produce a bar dwarfing every real one.
+    """
+    if len(frame) <= limit:
+        return None
+    y = pd.to_numeric(frame[y_key], errors="coerce")
+    keep = y.nlargest(limit - 1 if other else limit).index
+    kept = frame.loc[frame.index.isin(keep)]
+    if not other:
+        return kept
+    rest = frame.drop(index=keep)
+    bucket = {x_key: f"Other ({len(rest)} more)", y_key: pd.to_numeric(rest[y_key], errors="coerce").sum()}
+    return pd.concat([kept, pd.DataFrame([bucket])], ignore_index=True)
+
+
+def _scatter(frame: pd.DataFrame, x_key: str, y_key: str) -> Optional[pd.DataFrame]:
+    if len(frame) <= CHART_SCATTER_BINS * CHART_SCATTER_BINS:
+        return None
+    x = pd.to_numeric(frame[x_key], errors="coerce")
+    y = pd.to_numeric(frame[y_key], errors="coerce")
+    points = pd.DataFrame({x_key: x, y_key: y}).dropna()
+    if points.empty:
+        return None
+    # One point per occupied grid cell, at the cell's mean, weighted by how many it stands for
+    cells = points.groupby([
+        pd.cut(points[x_key], CHART_SCATTER_BINS, labels=False),
+        pd.cut(points[y_key], CHART_SCATTER_BINS, labels=False),
+    ])
+    binned = cells.mean().reset_index(drop=True)
+    binned["count"] = cells.size().to_numpy()
+    return binned
+
+
+def _keys(rows: List[Dict[str, Any]], payload: Dict[str, Any]):
+    """x/y keys of a chart, inferred like ChartRenderer does when the payload doesn't name them."""
+    first = rows[0]
+    x_key, y_key = payload.get("x_key"), payload.get("y_key")
+    if x_key not in first:
+        x_key = next((k for k, v in first.items() if isinstance(v, str)), next(iter(first), None))
+    if y_key not in first or y_key == x_key:
+        y_key = next((k for k, v in first.items()
+                      if k != x_key and isinstance(v, (int, float)) and not isinstance(v, bool)), None)
+    return x_key, y_key
+
+
+def downsample_widget(widget: Dict[str, Any]) -> Dict[str, Any]:
+    """Caps the points of a chart widget for its type, recording the original count.
+
+    Line charts keep their shape via LTTB, bar charts keep the largest categories, pie
+    charts the largest slices plus an "Other" bucket, scatter plots are binned onto a
+    grid. Payloads already within their cap are returned untouched.
+    """
+    payload = widget.get("payload")
+    if widget.get("vis_type") != "chart" or not isinstance(payload, dict):
+        return widget
+    rows = payload.get("data")
+    if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+        return widget
+    x_key, y_key = _keys(rows, payload)
+    if x_key is None or y_key is None:
+        return widget
+
+    chart_type = payload.get("type")
+    frame = pd.DataFrame(rows)
+    try:
+        if chart_type == "line" or chart_type == "area":
+            reduced, method = _line(frame, x_key, y_key), "lttb"
+        elif chart_type == "pie":
+            reduced, method = _top_n(frame, x_key, y_key, CHART_MAX_PIE_SLICES, other=True), "top_n"
+        elif chart_type == "scatter":
+            reduced, method = _scatter(frame, x_key, y_key), "binned"
+        else:
+            reduced, method = _top_n(frame, x_key, y_key, CHART_MAX_BARS, other=False), "top_n"
+    except (TypeError, ValueError) as e:
+        print(f"Warning: Could not downsample chart: {e}")
+        return widget
+    if reduced is None:
+        return widget
+
+    payload["data"] = reduced.astype(object).where(reduced.notna(), None).to_dict(orient="records")
+    payload["original_points"] = len(rows)
+    payload["downsampling"] = method
+    return widget
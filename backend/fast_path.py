@@ -0,0 +1,227 @@
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from backend.downsample import downsample_widget
+
+# --- CONFIG ---
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "1") == "1"
+FAST_PATH_MAX_BARS = int(os.getenv("FAST_PATH_MAX_BARS", "50"))
+HISTOGRAM_BINS = 10
+
+AGGREGATIONS = {
+    "total": "sum", "sum": "sum", "sum of": "sum", "overall": "sum",
+    "average": "mean", "avg": "mean", "mean": "mean",
+    "count": "count", "count of": "count", "number of": "count",
+    "max": "max", "maximum": "max", "highest": "max",
+    "min": "min", "minimum": "min", "lowest": "min",
+}
+AGG_WORDS = "|".join(sorted((re.escape(k) for k in AGGREGATIONS), key=len, reverse=True))
+
+LEAD = r"^(?:please )?(?:show(?: me)?|give(?: me)?|list|plot|chart|what (?:is|are)|get|display)?\s*(?:the |a )?"
+
+TOP_N = re.compile(LEAD + r"(top|bottom|best|worst)\s+(\d+)\s+(.+?)\s+(?:by|based on|in terms of)\s+(?:(" + AGG_WORDS + r")\s+)?(.+)$")
+AGG_BY = re.compile(LEAD + r"(" + AGG_WORDS + r")\s+(.+?)\s+(?:by|per|for each|across|for every)\s+(.+)$")
+AGG_ONLY = re.compile(LEAD + r"(" + AGG_WORDS + r")\s+(.+)$")
+DISTRIBUTION = re.compile(LEAD + r"(?:distribution|breakdown|split|histogram)\s+(?:of|for)\s+(.+?)(?:\s+(?:by|per)\s+(.+))?$")
+TREND = re.compile(LEAD + r"(?:(" + AGG_WORDS + r")\s+)?(.+?)\s+(?:trend|trends|over time)(?:\s+(?:over|by|across|per)\s+(.+))?$")
+TREND_OF = re.compile(LEAD + r"(?:trend|trends|evolution|change)\s+(?:of|in)\s+(?:(" + AGG_WORDS + r")\s+)?(.+?)(?:\s+(?:over|by|across|per)\s+(.+))?$")
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s_]+", " ", str(text)).strip().lower()
+
+
+def _singular(word: str) -> str:
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def resolve_column(phrase: Optional[str], columns: List[str]) -> Optional[str]:
+    """Maps a phrase from the question ("products", "order date") onto a column name.
+
+    Only exact and singular/plural matches count: a phrase with words left over
+    ("region excluding furniture", "profit margin") carries a filter or a different
+    measure the fast path can't honour, so it returns None and the agent answers.
+    """
+    if not phrase:
+        return None
+    phrase = _normalize(phrase)
+    phrase = re.sub(r"^(?:the|each|every|all)\s+", "", phrase)
+    normalized = {_normalize(c): c for c in columns}
+
+    if phrase in normalized:
+        return normalized[phrase]
+    singular = " ".join(_singular(w) for w in phrase.split())
+    for norm, col in normalized.items():
+        if " ".join(_singular(w) for w in norm.split()) == singular:
+            return col
+    return None
+
+
+def _label(value: Any) -> str:
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+def _chart(chart_type: str, title: str, x_key: str, y_key: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return downsample_widget({
+        "vis_type": "chart",
+        "payload": {"type": chart_type, "title": title, "x_key": x_key, "y_key": y_key, "data": rows},
+    })
+
+
+def _kpi(label: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, float):
+        value = round(value, 2)
+    return {"vis_type": "kpi", "payload": {"label": label, "value": value}}
+
+
+def _grouped(df: pd.DataFrame, x: str, y: Optional[str], agg: str) -> pd.Series:
+    if agg == "count" or y is None:
+        return df.groupby(x, observed=True, sort=False).size()
+    return df.groupby(x, observed=True, sort=False)[y].agg(agg)
+
+
+def _records(series: pd.Series, x: str, y: str) -> List[Dict[str, Any]]:
+    return [{x: _label(k), y: v} for k, v in zip(series.index, series.to_numpy().tolist())]
+
+
+def _top_n(df, direction, n, x_phrase, agg_word, y_phrase):
+    x = resolve_column(x_phrase, df.columns)
+    y = resolve_column(y_phrase, df.columns)
+    if x is None or y is None or not pd.api.types.is_numeric_dtype(df[y]):
+        return None
+    agg = AGGREGATIONS.get(agg_word or "total", "sum")
+    grouped = _grouped(df, x, y, agg)
+    n = max(1, min(int(n), FAST_PATH_MAX_BARS))
+    ascending = direction in ("bottom", "worst")
+    picked = grouped.nsmallest(n) if ascending else grouped.nlargest(n)
+    title = f"{direction.title()} {n} {x} by {y}"
+    return [_chart("bar", title, x, y, _records(picked, x, y))]
+
+
+def _agg_by(df, agg_word, y_phrase, x_phrase):
+    agg = AGGREGATIONS[agg_word]
+    x = resolve_column(x_phrase, df.columns)
+    y = resolve_column(y_phrase, df.columns)
+    if x is None:
+        return None
+    if agg == "count" and y is None and len(y_phrase.split()) == 1:
+        # "count of orders by region": counts rows; longer phrases may carry a filter
+        y_key = "count"
+    elif y is None or (agg != "count" and not pd.api.types.is_numeric_dtype(df[y])):
+        return None
+    else:
+        y_key = y
+
+    if pd.api.types.is_datetime64_any_dtype(df[x]):
+        return _trend(df, agg_word, y_phrase, x_phrase)
+
+    grouped = _grouped(df, x, y, agg).sort_values(ascending=False).head(FAST_PATH_MAX_BARS)
+    # Row counts are named after the counted entity ("Count of orders"), not the synthetic column
+    label = f"Count of {y or y_phrase}" if agg == "count" else f"{agg_word.capitalize()} {y}"
+    widgets = []
+    if agg in ("sum", "count"):
+        overall = len(df) if y is None else (df[y].sum() if agg == "sum" else df[y].count())
+        widgets.append(_kpi(label, overall))
+    chart_type = "pie" if len(grouped) <= 6 and agg in ("sum", "count") else "bar"
+    widgets.append(_chart(chart_type, f"{label} by {x}", x, y_key, _records(grouped, x, y_key)))
+    return widgets
+
+
+def _agg_only(df, agg_word, y_phrase):
+    agg = AGGREGATIONS[agg_word]
+    y = resolve_column(y_phrase, df.columns)
+    if y is None:
+        return None
+    if agg == "count":
+        return [_kpi(f"Count of {y}", int(df[y].count()))]
+    if not pd.api.types.is_numeric_dtype(df[y]):
+        return None
+    return [_kpi(f"{agg_word.capitalize()} {y}", df[y].agg(agg))]
+
+
+def _distribution(df, x_phrase, by_phrase):
+    x = resolve_column(x_phrase, df.columns)
+    if x is None:
+        return None
+    by = resolve_column(by_phrase, df.columns)
+    if by_phrase and by is None:
+        return None
+    series = df[x]
+
+    # "distribution of Sales by Region" -> share of the numeric column per category
+    if by is not None and pd.api.types.is_numeric_dtype(series):
+        grouped = _grouped(df, by, x, "sum").sort_values(ascending=False).head(FAST_PATH_MAX_BARS)
+        return [_chart("pie", f"Distribution of {x} by {by}", by, x, _records(grouped, by, x))]
+
+    if pd.api.types.is_numeric_dtype(series) and series.nunique() > HISTOGRAM_BINS:
+        counts = pd.cut(series.dropna(), bins=HISTOGRAM_BINS).value_counts(sort=False)
+        rows = [{x: f"{iv.left:,.0f} - {iv.right:,.0f}", "count": int(c)} for iv, c in counts.items()]
+        return [_chart("bar", f"Distribution of {x}", x, "count", rows)]
+
+    counts = series.value_counts().head(FAST_PATH_MAX_BARS)
+    chart_type = "pie" if len(counts) <= 6 else "bar"
+    return [_chart(chart_type, f"Distribution of {x}", x, "count", _records(counts, x, "count"))]
+
+
+def _date_column(df: pd.DataFrame, phrase: Optional[str]) -> Optional[str]:
+    if phrase:
+        col = resolve_column(phrase, df.columns)
+        return col if col is not None and pd.api.types.is_datetime64_any_dtype(df[col]) else None
+    date_cols = [c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])]
+    return date_cols[0] if len(date_cols) == 1 else None
+
+
+def _trend(df, agg_word, y_phrase, date_phrase):
+    y = resolve_column(y_phrase, df.columns)
+    date_col = _date_column(df, date_phrase)
+    if y is None or date_col is None or not pd.api.types.is_numeric_dtype(df[y]):
+        return None
+    agg = AGGREGATIONS.get(agg_word or "total", "sum")
+
+    dates = df[date_col]
+    span_days = (dates.max() - dates.min()).days if dates.notna().any() else 0
+    freq = "D" if span_days <= 92 else ("W" if span_days <= 366 else "MS")
+    series = df.set_index(date_col)[y].resample(freq).agg(agg).dropna()
+    return [_chart("line", f"{y} trend over {date_col}", date_col, y, _records(series, date_col, y))]
+
+
+def try_fast_path(query: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    """Answers common "top N / total by / distribution / trend" questions without the LLM.
+
+    Returns the same {"type": "dashboard", "payload": [...]} shape as the agent path, or
+    None when the question doesn't match an intent or names columns that don't resolve.
+    """
+    if not FAST_PATH_ENABLED or df is None or df.empty:
+        return None
+    q = _normalize(query).rstrip("?.! ")
+
+    widgets = None
+    try:
+        if m := TOP_N.match(q):
+            widgets = _top_n(df, *m.groups())
+        elif m := DISTRIBUTION.match(q):
+            widgets = _distribution(df, *m.groups())
+        elif m := TREND_OF.match(q):
+            widgets = _trend(df, *m.groups())
+        elif m := TREND.match(q):
+            widgets = _trend(df, *m.groups())
+        elif m := AGG_BY.match(q):
+            widgets = _agg_by(df, *m.groups())
+        elif m := AGG_ONLY.match(q):
+            widgets = _agg_only(df, *m.groups())
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Fast path gave up on '{query}': {e}")
+        return None
+
+    if not widgets:
+        return None
+    return {"type": "dashboard", "payload": widgets}
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import threading
+from typing import Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- CONFIG ---
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.5"))
+HTTP_KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_sync_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_openai = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_SIZE,
+        max_keepalive_connections=HTTP_POOL_SIZE,
+        keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+def http_session() -> requests.Session:
+    """Process-wide keep-alive `requests` session for blocking fetches (sheets, URL refresh).
+
+    Idempotent requests are retried with exponential backoff on connection errors and
+    on 429/5xx responses (honouring Retry-After).
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=("GET", "HEAD"),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+            _session = requests.Session()
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers["User-Agent"] = USER_AGENT
+        return _session
+
+
+def default_timeout():
+    """(connect, read) timeout tuple for `http_session()` calls."""
+    return (HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT)
+
+
+def async_client() -> httpx.AsyncClient:
+    """Process-wide pooled httpx client for async handlers; see `aget` for retries."""
+    global _async_client
+    with _lock:
+        if _async_client is None or _async_client.is_closed:
+            _async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                headers={"User-Agent": USER_AGENT},
+                follow_redirects=True,
+                transport=httpx.AsyncHTTPTransport(retries=HTTP_RETRIES, limits=_limits()),
+            )
+        return _async_client
+
+
+async def aget(url: str, **kwargs) -> httpx.Response:
+    """GET with exponential backoff on 429/5xx and transport errors (connects are retried by the transport)."""
+    client = async_client()
+    for attempt in range(HTTP_RETRIES + 1):
+        try:
+            response = await client.get(url, **kwargs)
+        except httpx.TransportError:
+            if attempt == HTTP_RETRIES:
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+                return response
+            await response.aclose()
+        await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+
+def openai_client():
+    """Shared OpenAI SDK client (one keep-alive pool) for every LLM call in the process.
+
+    The SDK retries 408/409/429/5xx and connection errors with backoff itself. Honours
+    OPENAI_API_BASE and OPENAI_PROXY like pandasai's OpenAI LLM, which this client
+    replaces for the agents.
+    """
+    global _openai, _sync_client
+    with _lock:
+        if _openai is None:
+            from openai import OpenAI
+            _sync_client = httpx.Client(
+                timeout=httpx.Timeout(LLM_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+                limits=_limits(),
+                proxy=os.getenv("OPENAI_PROXY") or None,
+            )
+            _openai = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=os.getenv("OPENAI_API_BASE") or None,
+                http_client=_sync_client,
+                max_retries=HTTP_RETRIES,
+            )
+        return _openai
+
+
+async def shutdown():
+    if _async_client is not None:
+        await _async_client.aclose()
+    if _sync_client is not None:
+        _sync_client.close()
+    if _session is not None:
+        _session.close()
@@ -0,0 +1,188 @@
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from backend.columnar import HAS_PYARROW, COLUMNAR_CACHE, columnar_path, is_fresh, read_columnar, write_columnar
+from backend.dataset_profile import build_profile
+from backend.result_cache import dataset_fingerprint
+from backend.sanitize import sanitize_dataframe
+
+# --- CONFIG ---
+INGEST_CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "100000"))
+
+if HAS_PYARROW:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+
+class SchemaDrift(Exception):
+    """A later chunk doesn't fit the schema the first chunk decided; the file is parsed whole instead."""
+
+
+class ColumnStats:
+    """Running row count, null counts and numeric/date min/max across chunks."""
+
+    def __init__(self):
+        self.rows = 0
+        self.nulls: Dict[str, int] = {}
+        self.mins: Dict[str, Any] = {}
+        self.maxs: Dict[str, Any] = {}
+
+    def update(self, chunk: pd.DataFrame):
+        self.rows += len(chunk)
+        for col, n in chunk.isna().sum().items():
+            self.nulls[col] = self.nulls.get(col, 0) + int(n)
+        for col in chunk.columns:
+            series = chunk[col]
+            if pd.api.types.is_bool_dtype(series.dtype) or not (
+                pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_any_dtype(series.dtype)
+            ):
+                continue
+            lo, hi = series.min(), series.max()
+            if pd.isna(lo):
+                continue
+            self.mins[col] = lo if col not in self.mins else min(self.mins[col], lo)
+            self.maxs[col] = hi if col not in self.maxs else max(self.maxs[col], hi)
+
+    def to_dict(self) -> Dict[str, Any]:
+        def scalar(v):
+            return v.isoformat() if isinstance(v, pd.Timestamp) else (v.item() if hasattr(v, "item") else v)
+        return {
+            "rows": self.rows,
+            "columns": {
+                col: {"nulls": n, "min": scalar(self.mins.get(col)), "max": scalar(self.maxs.get(col))}
+                for col, n in self.nulls.items()
+            },
+        }
+
+
+def _check_drift(table, target, untyped):
+    """Raises SchemaDrift where casting a chunk to the file's schema would change its values.
+
+    Arrow happily casts numbers, booleans and dates to strings, so a column that was empty
+    in the first chunk (typed as string) would store a later chunk's numbers as text. Dates
+    kept as text by sanitize_dataframe (values not in the file's date format) likewise no
+    longer fit a timestamp column.
+    """
+    for field, column in zip(table.schema, table.columns):
+        expected = target.field(field.name).type
+        # An all-null column (e.g. all-NaN float64) casts to anything without loss
+        if field.type == expected or column.null_count == len(column):
+            continue
+        if field.name in untyped and not pa.types.is_string(field.type):
+            raise SchemaDrift(f"column '{field.name}' was empty in the first chunk and is {field.type} later on")
+        if pa.types.is_timestamp(expected) and not pa.types.is_timestamp(field.type):
+            raise SchemaDrift(f"column '{field.name}' has values that don't match its date format")
+
+
+def _ingest_csv_streaming(path: str, report: Callable[..., None]) -> Dict[str, Any]:
+    """Parses a CSV in chunks, writing each sanitized chunk to the Parquet copy as it goes."""
+    total_bytes = os.path.getsize(path)
+    stats = ColumnStats()
+    cache_path = columnar_path(path)
+    tmp_path = cache_path + ".tmp"
+    writer = None
+    date_formats = None
+    untyped = set()
+
+    try:
+        with open(path, "rb") as fh:
+            for chunk in pd.read_csv(fh, chunksize=INGEST_CHUNK_ROWS, on_bad_lines='skip'):
+                # The first chunk decides date formats and the schema; later chunks follow them
+                chunk = sanitize_dataframe(chunk, date_formats=date_formats)
+                if date_formats is None:
+                    date_formats = chunk.attrs["date_formats"]
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # Columns with no values yet get a string type so later text still fits
+                    untyped = {c for c in chunk.columns if chunk[c].isna().all()}
+                    if untyped:
+                        schema = pa.schema([
+                            f.with_type(pa.string()) if f.name in untyped else f for f in table.schema
+                        ], metadata=table.schema.metadata)
+                        table = table.cast(schema)
+                    writer = pq.ParquetWriter(tmp_path, table.schema)
+                elif table.schema != writer.schema:
+                    _check_drift(table, writer.schema, untyped)
+                    table = table.cast(writer.schema)
+                writer.write_table(table)
+
+                stats.update(chunk)
+                report(
+                    rows=stats.rows,
+                    bytes_read=min(fh.tell(), total_bytes),
+                    total_bytes=total_bytes,
+                    percent=round(100 * min(fh.tell(), total_bytes) / max(total_bytes, 1), 1),
+                )
+        if writer is None:
+            raise ValueError("No columns to parse from file")
+        writer.close()
+        writer = None
+        os.replace(tmp_path, cache_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return stats.to_dict()
+
+
+def _ingest_whole(path: str, report: Callable[..., None]) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """Non-streaming fallback (Excel, no pyarrow, or chunks with incompatible types)."""
+    total_bytes = os.path.getsize(path)
+    if path.endswith('.csv'):
+        try:
+            df = pd.read_csv(path, on_bad_lines='skip')
+        except pd.errors.ParserError:
+            df = pd.read_csv(path, on_bad_lines='skip', engine='python')
+    else:
+        df = pd.read_excel(path)
+    df = sanitize_dataframe(df)
+    write_columnar(df, path)
+    stats = ColumnStats()
+    stats.update(df)
+    report(rows=stats.rows, bytes_read=total_bytes, total_bytes=total_bytes, percent=100.0)
+    return stats.to_dict(), df
+
+
+def ingest_file(path: str, report: Optional[Callable[..., None]] = None,
+                return_frame: bool = True) -> Tuple[Dict[str, Any], Optional[pd.DataFrame]]:
+    """Parses an uploaded file into its columnar copy, reporting progress along the way.
+
+    Returns the running stats (row count, per-column nulls and min/max) and, when the
+    file had to be parsed in one go, the DataFrame itself (None when it was streamed
+    to the columnar copy, which is then the thing to load). With `return_frame=False`
+    the frame is dropped whenever the columnar copy was written, so a worker process
+    doesn't pickle it back to the server.
+    """
+    report = report or (lambda **_: None)
+    if path.endswith('.csv') and HAS_PYARROW and COLUMNAR_CACHE:
+        try:
+            return _ingest_csv_streaming(path, report), None
+        except (SchemaDrift, pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError, pd.errors.ParserError) as e:
+            # e.g. a column that was empty in the first chunk and numeric later on, or a
+            # file only the python parser copes with
+            print(f"Warning: Streaming ingest fell back to a full parse: {e}")
+    summary, df = _ingest_whole(path, report)
+    if not return_frame and is_fresh(path):
+        df = None
+    return summary, df
+
+
+def profile_columnar(path: str, report: Optional[Callable[..., None]] = None) -> Optional[Dict[str, Any]]:
+    """Profiles the columnar copy of `path`, or returns None if there is no current copy.
+
+    Meant for a worker process, so a streamed file is never fully loaded by the server
+    just to profile it. The fingerprint is that of the frame `/chat` later loads from
+    the same copy, so the profile stays valid once the file is lazily loaded.
+    """
+    report = report or (lambda **_: None)
+    df = read_columnar(path)
+    if df is None:
+        return None
+    report(rows=len(df))
+    profile = build_profile(df)
+    profile["fingerprint"] = dataset_fingerprint(df)
+    return profile
@@ -0,0 +1,274 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+# --- CONFIG ---
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_PROCESSES = int(os.getenv("JOB_PROCESSES", str(max(1, (os.cpu_count() or 2) - 1))))
+# Ingest has its own lane, sized so every worker process can be parsing a file at once
+JOB_INGEST_WORKERS = int(os.getenv("JOB_INGEST_WORKERS", str(max(1, JOB_PROCESSES))))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", "2"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+JOB_POLL_INTERVAL = 0.25
+
+# Lower runs first
+PRIORITY_INGEST = 0
+PRIORITY_PROFILE = 5
+PRIORITY_WARMUP = 10
+
+TERMINAL_STATES = ("done", "failed", "cancelled")
+LANE_INGEST = "ingest"
+LANE_BACKGROUND = "background"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class _ProcessReporter:
+    """Picklable progress callback for job steps running in a worker process."""
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def __call__(self, **progress):
+        if self.shared.get("__cancel__"):
+            raise JobCancelled()
+        self.shared.update(progress)
+
+
+class Job:
+    """State of one background job, readable by /jobs/{id} while it runs."""
+
+    def __init__(self, kind: str, user_id: Any, priority: int, max_retries: int,
+                 retry_on: Tuple[Type[BaseException], ...], owner: "JobQueue"):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.priority = priority
+        self.max_retries = max_retries
+        self.retry_on = retry_on
+        self.attempts = 0
+        self.status = "queued"
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_requested = False
+        # Resolved with the job itself once it reaches a terminal state
+        self.future: Future = Future()
+        self._owner = owner
+
+    def report(self, **progress):
+        """Progress callback for job functions; also the cooperative cancellation point."""
+        if self.cancel_requested:
+            raise JobCancelled()
+        self.progress.update(progress)
+        self.updated_at = time.time()
+
+    def run_in_process(self, fn: Callable, *args):
+        """Runs the CPU-heavy `fn(*args, report=...)` on the process pool, relaying progress/cancel."""
+        return self._owner.run_in_process(self, fn, *args)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "progress": dict(self.progress),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobQueue:
+    """Priority job queue for ingest/profile/warmup work.
+
+    Jobs are dispatched in priority order by the threads of their lane: ingest jobs by
+    `ingest_workers` threads (one per worker process by default), everything else by
+    `workers` threads, so profiling and warmups never hold back parsing. Steps that
+    parse data call `job.run_in_process(...)` to use a pool of JOB_PROCESSES worker
+    processes, so parsing scales across cores without holding the GIL that the
+    uvicorn workers serving /chat need. Set JOB_PROCESSES=0 to run them inline.
+
+    A failed job is retried (with backoff) up to `max_retries` times when its error is
+    one of `retry_on`, i.e. transient; other errors fail it at once.
+    """
+
+    def __init__(self, workers: int, processes: int, ingest_workers: int):
+        self.workers = workers
+        self.processes = processes
+        self.ingest_workers = ingest_workers
+        self._queues: Dict[str, "queue.PriorityQueue"] = {
+            LANE_INGEST: queue.PriorityQueue(),
+            LANE_BACKGROUND: queue.PriorityQueue(),
+        }
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._closed = False
+
+    def _start(self):
+        if self._threads:
+            return
+        for lane, count in ((LANE_INGEST, self.ingest_workers), (LANE_BACKGROUND, self.workers)):
+            for i in range(count):
+                t = threading.Thread(target=self._worker, args=(lane,), name=f"job-{lane}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, kind: str, user_id: Any, fn: Callable[..., Any], *args,
+               priority: int = PRIORITY_INGEST, max_retries: int = 0,
+               retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+               on_success: Optional[Callable[[Job], None]] = None) -> Job:
+        """Queues `fn(*args, job=job)` and returns its Job (ingest jobs run on their own lane)."""
+        job = Job(kind, user_id, priority, max_retries, retry_on, self)
+        job._fn, job._args, job._on_success = fn, args, on_success
+        with self._lock:
+            self._prune()
+            self._jobs[job.id] = job
+            self._start()
+        lane = LANE_INGEST if kind == "ingest" else LANE_BACKGROUND
+        self._queues[lane].put((priority, next(self._seq), job))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a queued job immediately, or asks a running one to stop at its next checkpoint."""
+        job = self.get(job_id)
+        if job is None or job.status in TERMINAL_STATES:
+            return False
+        job.cancel_requested = True
+        if job.status in ("queued", "retrying"):
+            self._finish(job, "cancelled")
+        return True
+
+    def _finish(self, job: Job, status: str):
+        with self._lock:
+            if job.future.done():
+                return
+            job.status = status
+            job.updated_at = time.time()
+        job.future.set_result(job)
+        if status == "done" and job._on_success is not None:
+            try:
+                job._on_success(job)
+            except Exception as e:
+                print(f"⚠️ Follow-up of job {job.kind} failed: {e}")
+
+    def _worker(self, lane: str):
+        while not self._closed:
+            try:
+                _, _, job = self._queues[lane].get(timeout=1)
+            except queue.Empty:
+                continue
+            if job.future.done():
+                continue
+            self._run(job)
+
+    def _run(self, job: Job):
+        while True:
+            job.attempts += 1
+            job.status = "running"
+            job.updated_at = time.time()
+            try:
+                job.result = job._fn(*job._args, job=job)
+                self._finish(job, "done")
+                return
+            except JobCancelled:
+                self._finish(job, "cancelled")
+                return
+            except Exception as e:
+                if job.cancel_requested:
+                    # e.g. its file was deleted under it; the error is a consequence of the cancel
+                    self._finish(job, "cancelled")
+                    return
+                traceback.print_exc()
+                job.error = str(e)
+                transient = isinstance(e, job.retry_on)
+                if not transient or job.attempts > job.max_retries:
+                    self._finish(job, "failed")
+                    return
+                job.status = "retrying"
+                job.updated_at = time.time()
+                time.sleep(JOB_RETRY_BACKOFF * job.attempts)
+                if job.cancel_requested:
+                    self._finish(job, "cancelled")
+                    return
+
+    def run_in_process(self, job: Job, fn: Callable, *args):
+        if self.processes <= 0:
+            return fn(*args, report=job.report)
+
+        with self._lock:
+            if self._process_pool is None:
+                # spawn: forking a process that is running threads is unsafe
+                ctx = multiprocessing.get_context("spawn")
+                self._manager = ctx.Manager()
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=ctx)
+            pool = self._process_pool
+        shared = self._manager.dict()
+        future = pool.submit(fn, *args, report=_ProcessReporter(shared))
+        while True:
+            done, _ = wait([future], timeout=JOB_POLL_INTERVAL)
+            progress = {k: v for k, v in shared.items() if k != "__cancel__"}
+            if progress:
+                job.progress.update(progress)
+                job.updated_at = time.time()
+            if done:
+                if future.cancelled():
+                    raise JobCancelled()
+                try:
+                    return future.result()
+                except BrokenProcessPool:
+                    # A worker process died (e.g. killed for memory); the next attempt gets a fresh pool
+                    with self._lock:
+                        if self._process_pool is pool:
+                            self._process_pool = None
+                    raise
+            if job.cancel_requested:
+                shared["__cancel__"] = True
+                future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"workers": self.workers, "ingest_workers": self.ingest_workers,
+                    "processes": self.processes, "jobs": counts}
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.status in TERMINAL_STATES and j.updated_at < cutoff]:
+            del self._jobs[job_id]
+
+    def shutdown(self):
+        self._closed = True
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
+
+
+job_queue = JobQueue(JOB_WORKERS, JOB_PROCESSES, JOB_INGEST_WORKERS)
@@ -1,30 +1,51 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, BackgroundTasks, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 import pandas as pd
-from pandasai import SmartDataframe
-from pandasai_openai import OpenAI
 import os
 from dotenv import load_dotenv
 import json
 import re
 import ast
-import requests
+import httpx
 import shutil
 import tempfile
 import time
 import uuid
-from io import StringIO
+from io import BytesIO
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import select, Session
-from typing import Dict, Any, List
-import numpy as np
-import math
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Dict, Any, List, Optional, Callable
+from datetime import datetime
+import asyncio
+import functools
+from contextlib import ExitStack
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy.exc import OperationalError
 
 # --- INTERNAL MODULES ---
-from backend.database import engine, get_session
-from backend.models import User, AnalysisSession, Widget
-from backend.auth import get_password_hash, verify_password, create_access_token, get_current_user
+from backend.database import engine, async_engine, get_async_session, init_db
+from backend.models import User, AnalysisSession, Widget, DatasetProfile
+from backend.auth import hash_password_async, verify_password_async, create_access_token, get_current_user, auth_cache
+from backend.workers import analysis_pool
+from backend.result_cache import ResultCache, result_cache, dataset_fingerprint
+from backend.session_store import session_store
+from backend.agents import agent_pool
+from backend.columnar import read_columnar, preview_columnar, write_columnar, remove_columnar
+from backend.sanitize import sanitize_dataframe
+from backend.responses import FastJSONResponse, dumps
+from backend.fast_path import try_fast_path
+from backend.dataset_profile import build_profile
+from backend import url_refresh, http_client, auth, session_meta
+from backend.sheets import fetch_sheet, SheetError
+from backend.jobs import job_queue, TERMINAL_STATES, PRIORITY_PROFILE, PRIORITY_WARMUP, JOB_MAX_RETRIES
+from backend.ingest import ingest_file, profile_columnar
+from backend.downsample import downsample_widget
+from backend.coalesce import file_locks, query_flights
+from backend.sql_engine import sql_engine, sql_enabled, can_scan_columnar, answer_with_sql, answer_across_files, HAS_DUCKDB, SQL_PROMPT_VERSION
 
 # --- CONFIGURATION ---
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
@@ -39,47 +60,50 @@ def get_session_user_id(request: Request) -> int:
     """
     session_id = request.headers.get("X-Session-ID", "default-session")
     
-    # Convert UUID string to consistent integer hash
-    # This allows us to use session IDs as user_id in the database
-    user_id = abs(hash(session_id)) % (10**8)  # Keep it within reasonable integer range
-    
-    return user_id
+    # Deterministic digest (not hash(), which is salted per process) so every
+    # worker and restart maps a session to the same user_id in the database
+    return session_meta.user_id_for(session_id)
+
+# Agents hold a reference to their DataFrame; release them together
+session_store.on_evict(lambda file_info: agent_pool.discard(file_info["id"]))
+
+def forget_file(file_info: Dict[str, Any]):
+    """Releases the memory and agent of a file removed from its session, and stops its jobs."""
+    file_info["deleted"] = True
+    for job_id in file_info.get("job_ids", []):
+        job_queue.cancel(job_id)
+    session_store.forget(file_info)
+    agent_pool.discard(file_info["id"])
 
 # --- WARMUP HELPER ---
-def warmup_agent(user_id: int, file_id: str):
-    """Initializes the SmartDataframe and runs a dummy query to warm up the LLM."""
+def warmup_agent(user_id: int, file_id: str, job=None):
+    """Builds the file's pooled agent and prepares its schema state locally (no LLM call)."""
     print(f"🔥 Warming up agent for User {user_id}, File {file_id}...")
     try:
         session_data = get_user_session(user_id)
         if file_id in session_data["files"]:
             file_info = session_data["files"][file_id]
             
-            # 1. Initialize DF if needed
-            if file_info.get("df") is None:
-                 if file_info.get("path"):
-                    if file_info["path"].endswith('.csv'):
-                        file_info["df"] = pd.read_csv(file_info["path"], on_bad_lines='skip')
-                    else:
-                        file_info["df"] = pd.read_excel(file_info["path"])
-            
-            # 2. Initialize Agent if needed
-            if "sdf" not in file_info or file_info.get("sdf") is None:
-                api_key = os.getenv("OPENAI_API_KEY")
-                llm = OpenAI(api_token=api_key, model="gpt-4o-mini")
-                file_info["sdf"] = SmartDataframe(file_info["df"], config={
-                    "llm": llm, 
-                    "enable_cache": True,
-                    "model_name": "gpt-4o-mini"
-                })
+            if file_info.get("df") is None and can_scan_columnar(file_info.get("path")):
+                # Left on disk after ingest; the pandas path loads it on first use
+                print(f"⏭️  {file_info['filename']} is not loaded, skipping warmup")
+                return
+
+            with session_store.pinned(file_info):
+                # 1. Initialize DF if needed
+                with file_locks.hold(file_info["id"]):
+                    if file_info.get("df") is None and file_info.get("path"):
+                        set_dataframe(file_info, load_dataframe(file_info["path"]))
             
-            # 3. Validation Run (Head/Describe)
-            # This forces the agent to extract headers and potentially cache the schema
-            print("   -> Running initial schema extraction...")
-            file_info["sdf"].chat("Show me the first 5 rows")
-            print(f"✅ Agent warmed up for {file_info['filename']}")
+                # 2. Build the agent for this version and precompute its schema/prompt state
+                if file_info.get("deleted"):
+                    return
+                agent_pool.warm(file_info)
+                print(f"✅ Agent warmed up for {file_info['filename']}")
             
     except Exception as e:
         print(f"⚠️ Warmup failed: {e}")
+        raise
 
 # --- CONFIGURATION ---
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
@@ -87,11 +111,24 @@ load_dotenv(dotenv_path, override=True)
 
 app = FastAPI()
 
+# --- UPLOADS ---
+UPLOAD_ASYNC_THRESHOLD_MB = int(os.getenv("UPLOAD_ASYNC_THRESHOLD_MB", "50"))
+UPLOAD_COPY_BUFFER = 1024 * 1024
+JOB_EVENTS_INTERVAL = 0.5
+
 # --- DB STARTUP ---
 @app.on_event("startup")
 def on_startup():
-    from sqlmodel import SQLModel
-    SQLModel.metadata.create_all(engine)
+    init_db(engine)
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    analysis_pool.shutdown()
+    url_refresh.shutdown()
+    job_queue.shutdown()
+    await http_client.shutdown()
+    auth.shutdown()
+    await async_engine.dispose()
 
 # CORS configuration
 origins = [
@@ -108,47 +145,80 @@ app.add_middleware(
 )
 
 # --- MULTI-USER STATE MANAGEMENT ---
-user_sessions: Dict[int, Dict[str, Any]] = {}
-
 def get_user_session(user_id: int) -> Dict[str, Any]:
-    """Retrieves session dict. If empty, tries to restore from DB."""
-    # DEBUG PRINT
-    if user_id in user_sessions:
-        print(f"    - Found active session for user {user_id}")
-    else:
-        print(f"    - No active session for user {user_id}, restoring from DB...")
-        user_sessions[user_id] = {"files": {}, "active_file_id": None}
-        
-        # Restore files from database
-        from backend.database import SessionLocal
-        from backend.models import UploadedFile
-        from sqlmodel import select
-        
-        db = SessionLocal()
-        try:
-            statement = select(UploadedFile).where(UploadedFile.user_id == user_id)
-            db_files = db.exec(statement).all()
+    """Retrieves session dict, synced with the state shared by all workers. If empty, tries to restore from DB.
+
+    Blocking (sync database reads); async routes call it through run_in_threadpool.
+    """
+    session_data = session_store.get(user_id)
+    stored_version = session_meta.version(user_id)
+    if session_data is not None:
+        if stored_version is not None and stored_version != session_data.get("version"):
+            # Another worker (or request) changed this user's files
+            session_meta.sync(session_data, session_meta.load(user_id), forget_file)
+        return session_data
+
+    print(f"✨ Initializing fresh session for User ID: {user_id}")
+    session_data = session_store.create(user_id)
+    if stored_version is not None:
+        session_meta.sync(session_data, session_meta.load(user_id), forget_file)
+        print(f"♻️  Loaded {len(session_data['files'])} files from shared session state")
+        return session_data
+    
+    # RESTORE FROM DB
+    try:
+        with Session(engine) as db:
+            statement = select(AnalysisSession).where(AnalysisSession.user_id == user_id)
+            results = db.exec(statement).all()
             
-            for db_file in db_files:
-                user_sessions[user_id]["files"][db_file.file_id] = {
-                    "id": db_file.file_id,
-                    "filename": db_file.filename,
-                    "path": db_file.file_path,
-                    "source": db_file.source,
-                    "url": db_file.url,
-                    "df": None,  # Lazy load
-                    "sdf": None,  # Lazy load
-                    "timestamp": 0
-                }
-                # Set the most recent file as active
-                if user_sessions[user_id]["active_file_id"] is None:
-                    user_sessions[user_id]["active_file_id"] = db_file.file_id
-                    
-            print(f"    - Restored {len(db_files)} files from database")
-        finally:
-            db.close()
+            if results:
+                print(f"♻️  Restoring {len(results)} files from database...")
+                for record in results:
+                    # Check if file exists on disk
+                    if os.path.exists(record.file_path):
+                        file_id = str(record.id) # Use Stable DB ID
+                        source = "url" if "Google Sheet" in record.file_name else "file"
+                        
+                        session_data["files"][file_id] = {
+                            "id": file_id,
+                            "df": None, # Lazy load
+                            "filename": record.file_name,
+                            "path": record.file_path,
+                            "source": source,
+                            "timestamp": os.path.getmtime(record.file_path)
+                        }
+                        session_data["active_file_id"] = file_id
+                        print(f"   -> Restored {record.file_name} (ID: {file_id})")
+                seed_shared_session(user_id, session_data)
+            else:
+                print(f"   -> No records found in DB for UserID: {user_id}")
+                
+    except Exception as e:
+        print(f"⚠️ Failed to restore session from DB: {e}")
+        import traceback
+        traceback.print_exc()
         
-    return user_sessions[user_id]
+    return session_data
+
+def seed_shared_session(user_id: int, session_data: Dict[str, Any]):
+    """Stores a session restored from AnalysisSession records as the shared state (first worker wins)."""
+    def seed(state):
+        if not state["files"]:
+            state["files"] = {fid: session_meta.file_meta(fi) for fid, fi in session_data["files"].items()}
+            state["active_file_id"] = session_data.get("active_file_id")
+
+    session_data["version"] = session_meta.mutate(user_id, seed)
+
+async def rehash_password(session: AsyncSession, user: User, new_hash: str):
+    """Stores a hash upgraded to the current BCRYPT_ROUNDS; a failure only delays the upgrade."""
+    try:
+        user.password_hash = new_hash
+        session.add(user)
+        await session.commit()
+        auth_cache.invalidate_user(user.email)
+    except Exception as e:
+        await session.rollback()
+        print(f"Warning: Could not store rehashed password: {e}")
 
 class UserCreate(BaseModel):
     email: str
@@ -157,78 +227,42 @@ class UserCreate(BaseModel):
 # --- AUTH ROUTES ---
 
 @app.post("/register")
-async def register(user_data: UserCreate, session: Session = Depends(get_session)):
+async def register(user_data: UserCreate, session: AsyncSession = Depends(get_async_session)):
     # Check existing
     statement = select(User).where(User.email == user_data.email)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create User
     new_user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password)
+        password_hash=await hash_password_async(user_data.password)
     )
     session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    await session.commit()
+    await session.refresh(new_user)
+    auth_cache.invalidate_user(new_user.email)
     
     # Generate Token
     access_token = create_access_token(data={"sub": new_user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/token")
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.email == form_data.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    valid, new_hash = await verify_password_async(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+    if new_hash:
+        await rehash_password(session, user, new_hash)
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
-    print(f"🔍 get_user_session called for UserID: {user_id}")
-    
-    if user_id not in user_sessions:
-        print(f"✨ Initializing fresh session for User ID: {user_id}")
-        user_sessions[user_id] = {
-            "files": {},
-            "active_file_id": None
-        }
-        
-        # RESTORE FROM DB
-        try:
-            with Session(engine) as db:
-                statement = select(AnalysisSession).where(AnalysisSession.user_id == user_id)
-                results = db.exec(statement).all()
-                
-                if results:
-                    print(f"♻️  Restoring {len(results)} files from database...")
-                    for record in results:
-                        # Check if file exists on disk
-                        if os.path.exists(record.file_path):
-                            file_id = str(record.id) # Use Stable DB ID
-                            source = "url" if "Google Sheet" in record.file_name else "file"
-                            
-                            user_sessions[user_id]["files"][file_id] = {
-                                "df": None, # Lazy load
-                                "filename": record.file_name,
-                                "path": record.file_path,
-                                "source": source,
-                                "timestamp": os.path.getmtime(record.file_path)
-                            }
-                            user_sessions[user_id]["active_file_id"] = file_id
-                            print(f"   -> Restored {record.file_name} (ID: {file_id})")
-                else:
-                    print(f"   -> No records found in DB for UserID: {user_id}")
-                    
-        except Exception as e:
-            print(f"⚠️ Failed to restore session from DB: {e}")
-            import traceback
-            traceback.print_exc()
-            
-    return user_sessions[user_id]
-
 
 class UserRegister(BaseModel):
     email: str
@@ -246,97 +280,67 @@ class WidgetCreate(BaseModel):
 class QueryRequest(BaseModel):
     query: str
     file_id: str | None = None
+    file_ids: List[str] | None = None  # several files at once (cross-file questions, SQL engine)
+    engine: str | None = None  # "pandas" or "sql"; defaults to ANALYSIS_ENGINE
 
 class ConnectRequest(BaseModel):
     url: str
+    gids: Optional[List[str]] = None  # Google Sheets tabs to import; default is the tab in the link
+    all_tabs: bool = False  # Import every tab of the spreadsheet as its own dataset
 
 # --- HELPER: DATA CLEANING ---
-def sanitize_dataframe(df):
-    # 1. Strip whitespace
-    df.columns = [str(c).strip() for c in df.columns]
-    
-    # 2. Convert Dates
-    for col in df.columns:
-        if "date" in col.lower() or "time" in col.lower():
-            try:
-                df[col] = pd.to_datetime(df[col])
-            except:
-                pass
-                
-    # 3. Aggressive Sanitization for JSON
-    df = df.replace([np.inf, -np.inf], np.nan)
-    df = df.where(pd.notnull(df), None)
-    
-    for col in df.columns:
-        if pd.api.types.is_float_dtype(df[col]):
-             df[col] = df[col].astype(object).where(pd.notnull(df[col]), None)
-             
-    return df
+def load_dataframe(path: str):
+    """Loads a sanitized DataFrame, preferring the columnar copy when it is newer than the source."""
+    df = read_columnar(path)
+    if df is not None:
+        print(f"   -> Loaded columnar cache for {os.path.basename(path)}")
+        return df
 
-def clean_for_json(obj):
-    if isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif isinstance(obj, dict):
-        return {k: clean_for_json(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_for_json(v) for v in obj]
-    return obj
-
-def detect_domain_context(df):
-    cols = " ".join([str(c).lower() for c in df.columns])
-    if any(x in cols for x in ['sales', 'revenue', 'profit', 'cost', 'qty']):
-        return "Retail/Sales Context. Focus on: Revenue trends, Top selling products, Profit margins."
-    elif any(x in cols for x in ['student', 'marks', 'grade', 'attendance', 'subject']):
-        return "Education Context. Focus on: Student performance, Pass/Fail rates, Subject averages."
-    elif any(x in cols for x in ['employee', 'salary', 'dept', 'hiring']):
-        return "HR Context. Focus on: Headcount, Salary distribution, Attrition."
+    if path.endswith('.csv'):
+        df = pd.read_csv(path, on_bad_lines='skip')
     else:
-        return "General Data Analysis Context. Focus on patterns and outliers."
-
-def detect_wide_format_dates(df):
-    date_cols = 0
-    total_cols = len(df.columns)
-    if total_cols < 2: return False
-    for col in df.columns:
-        try:
-            pd.to_datetime(str(col))
-            date_cols += 1
-        except: pass
-    return (date_cols / total_cols) > 0.3
+        df = pd.read_excel(path)
+    df = sanitize_dataframe(df)
+    write_columnar(df, path)
+    return df
 
 # --- ROUTES ---
 
 @app.post("/register", response_model=Token)
-def register(user_data: UserRegister, session: Session = Depends(get_session)):
+async def register(user_data: UserRegister, session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.email == user_data.email)
-    existing_user = session.exec(statement).first()
+    existing_user = (await session.exec(statement)).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_pwd = get_password_hash(user_data.password)
+    hashed_pwd = await hash_password_async(user_data.password)
     user = User(email=user_data.email, password_hash=hashed_pwd)
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    auth_cache.invalidate_user(user.email)
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/token", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Session = Depends(get_session)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: AsyncSession = Depends(get_async_session)):
     statement = select(User).where(User.email == form_data.username)
-    user = session.exec(statement).first()
+    user = (await session.exec(statement)).first()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    valid, new_hash = await verify_password_async(form_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
+    if new_hash:
+        await rehash_password(session, user, new_hash)
     
     access_token = create_access_token(data={"sub": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/widget/save")
-def save_widget(widget: WidgetCreate, session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def save_widget(widget: WidgetCreate, session: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
     new_widget = Widget(
         user_id=current_user.id,
         title=widget.title,
@@ -344,15 +348,15 @@ def save_widget(widget: WidgetCreate, session: Session = Depends(get_session), c
         payload=widget.payload
     )
     session.add(new_widget)
-    session.commit()
-    session.refresh(new_widget)
+    await session.commit()
+    await session.refresh(new_widget)
     return {"message": "Widget saved!", "id": new_widget.id}
 
 @app.get("/dashboard")
-def get_dashboard(session: Session = Depends(get_session), current_user: User = Depends(get_current_user)):
+async def get_dashboard(session: AsyncSession = Depends(get_async_session), current_user: User = Depends(get_current_user)):
     statement = select(Widget).where(Widget.user_id == current_user.id).order_by(Widget.created_at.desc())
-    widgets = session.exec(statement).all()
-    return widgets
+    widgets = (await session.exec(statement)).all()
+    return FastJSONResponse(widgets)
 
 @app.get("/files")
 def get_files(request: Request):
@@ -372,31 +376,57 @@ def get_files(request: Request):
     print(f"   -> Returning {len(files_list)} files: {[f['filename'] for f in files_list]}")
     return files_list
 
+@app.get("/files/{file_id}/profile")
+async def get_file_profile(file_id: str, request: Request):
+    user_id = get_session_user_id(request)
+    session_data = await run_in_threadpool(get_user_session, user_id)
+    if file_id not in session_data["files"]:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    file_info = session_data["files"][file_id]
+    if file_info.get("ingesting"):
+        raise HTTPException(status_code=409, detail=ingest_status_message(file_info))
+    profile = file_info.get("profile")
+    if profile is None or profile.get("fingerprint") != file_info.get("fingerprint"):
+        # May need a DB read or a full load + profile; keep it off the event loop
+        profile = await analysis_pool.run(user_id, profile_file, file_info)
+    return FastJSONResponse(profile)
+
 @app.delete("/files/{file_id}")
-def delete_file(file_id: str, request: Request, session: Session = Depends(get_session)):
+async def delete_file(file_id: str, request: Request, session: AsyncSession = Depends(get_async_session)):
     try:
         # Get user ID from session
         user_id = get_session_user_id(request)
-        session_data = get_user_session(user_id)
+        session_data = await run_in_threadpool(get_user_session, user_id)
         
         # 1. Check Memory
         if file_id in session_data["files"]:
             file_info = session_data["files"][file_id]
             file_path = file_info["path"]
             
-            # Remove from Memory
-            del session_data["files"][file_id]
+            # Remove from the state shared with other workers, then from Memory
+            await run_in_threadpool(session_meta.drop_file, user_id, file_id)
+            forget_file(file_info)
+            session_data["files"].pop(file_id, None)
             
             # If active, clear active
             if session_data.get("active_file_id") == file_id:
                 session_data["active_file_id"] = None
                 
             # 2. Remove from DB
+            fingerprints = {file_info.get("fingerprint")}
             statement = select(AnalysisSession).where(AnalysisSession.user_id == user_id, AnalysisSession.file_path == file_path)
-            results = session.exec(statement).all()
+            results = (await session.exec(statement)).all()
             for record in results:
-                session.delete(record)
-            session.commit()
+                for profile in (await session.exec(select(DatasetProfile).where(DatasetProfile.session_id == record.id))).all():
+                    fingerprints.add(profile.fingerprint)
+                    await session.delete(profile)
+                await session.delete(record)
+            await session.commit()
+
+            # Cached answers about the file (also those computed by other workers)
+            for fingerprint in fingerprints - {None}:
+                await run_in_threadpool(result_cache.invalidate, fingerprint)
             
             # 3. Remove from Disk (Optional: might want to keep if shared, but here it's per user)
             # Only delete if it exists and looks like a temp file we created
@@ -405,6 +435,7 @@ def delete_file(file_id: str, request: Request, session: Session = Depends(get_s
                     os.remove(file_path)
                 except Exception as e:
                     print(f"Warning: Could not delete file from disk: {e}")
+                remove_columnar(file_path)
             
             return {"message": "File deleted successfully"}
         else:
@@ -418,114 +449,89 @@ def delete_file(file_id: str, request: Request, session: Session = Depends(get_s
 async def connect_url(
     request_body: ConnectRequest,
     request: Request,
-    background_tasks: BackgroundTasks,
-    session: Session = Depends(get_session)
+    background: bool = False,
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         # Get user ID from session
         user_id = get_session_user_id(request)
         
         url = request_body.url.strip()
-        sheet_title = "Google Sheet Data"
-        
-        if "docs.google.com/spreadsheets" in url:
-            match = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
-            if match:
-                sheet_id = match.group(1)
-                
-                # Try to fetch title from public HTML
-                try:
-                    meta_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit"
-                    res = requests.get(meta_url, timeout=5)
-                    if res.status_code == 200:
-                        # Simple regex to find title tag: <title>SheetName - Google Sheets</title>
-                        title_match = re.search(r"<title>(.*?) - Google Sheets</title>", res.text)
-                        if title_match:
-                            sheet_title = title_match.group(1).strip()
-                except Exception as e:
-                    print(f"Failed to fetch sheet title: {e}")
-
-                gid_match = re.search(r"[#&]gid=([0-9]+)", url)
-                gid_param = f"&gid={gid_match.group(1)}" if gid_match else ""
-                url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv{gid_param}"
-            else:
-                 raise HTTPException(status_code=400, detail="Invalid Google Sheet URL")
-
         print(f"🌊 Streaming data from: {url}")
-        
-        # Use the fetched title for filename
-        final_filename = f"{sheet_title}.csv"
 
-        
-        headers = { "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36" }
-        
-        with requests.get(url, headers=headers, stream=True, timeout=30) as response:
-            response.raise_for_status()
-            if "text/html" in response.headers.get("Content-Type", ""):
-                raise HTTPException(status_code=400, detail="❌ Permission Error: Sheet is private.")
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-                for chunk in response.iter_content(chunk_size=8192):
-                    tmp.write(chunk)
-                tmp_path = tmp.name
+        # Title lookup and tab downloads run concurrently on the pooled async client
+        tabs = await fetch_sheet(url, request_body.gids, request_body.all_tabs)
+        print(f"✅ Downloaded {len(tabs)} tab(s). Loading...")
 
-        print(f"✅ Downloaded to {tmp_path}. Loading...")
-        try:
-            df = pd.read_csv(tmp_path, on_bad_lines='skip')
-        except:
-             df = pd.read_csv(tmp_path, on_bad_lines='skip', engine='python')
-             
-        df = sanitize_dataframe(df)
-        
-        # SAVE TO DB FIRST TO GET ID
-        try:
-            db_record = AnalysisSession(
-                user_id=user_id,
-                file_path=tmp_path,
-                file_name=final_filename
-            )
-            session.add(db_record)
-            session.commit()
-            session.refresh(db_record)
-            
-            file_id = str(db_record.id) # Use Stable DB ID
-            
-            session_data = get_user_session(anonymous_user_id)
-            session_data["files"][file_id] = {
-                "df": df,
-                "filename": final_filename,
-                "path": tmp_path,
+        session_data = await run_in_threadpool(get_user_session, user_id)
+        loading = []
+        for tab in tabs:
+            # SAVE TO DB FIRST TO GET ID
+            try:
+                db_record = AnalysisSession(
+                    user_id=user_id,
+                    file_path=tab["path"],
+                    file_name=tab["filename"]
+                )
+                session.add(db_record)
+                await session.commit()
+                await session.refresh(db_record)
+                
+                file_id = str(db_record.id) # Use Stable DB ID
+            except Exception as e:
+                 print(f"Warning: Failed to save to DB: {e}")
+                 # Fallback if DB fails (shouldn't happen)
+                 file_id = str(uuid.uuid4())
+
+            file_info = {
+                "id": file_id,
+                "df": None,
+                "filename": tab["filename"],
+                "path": tab["path"],
                 "source": "url",
-                "url": url
+                "url": tab["url"],
+                "ingesting": True
             }
-            session_data["active_file_id"] = file_id
+            # Validators for the conditional, TTL-based auto-refresh in /chat
+            url_refresh.remember_fetch(file_info, tab["headers"], tab["hash"])
+            # Shared state first: a sync from another request must not drop the new file
+            await run_in_threadpool(session_meta.put_file, user_id, file_info, tab is tabs[0])
+            session_data["files"][file_id] = file_info
 
-            # SCHEDULE WARMUP
-            background_tasks.add_task(warmup_agent, anonymous_user_id, file_id)
+            # Same ingest -> profile -> warmup jobs as /upload; tabs parse in parallel
+            loading.append((submit_ingest(user_id, file_info), file_info))
+        session_data["active_file_id"] = loading[0][1]["id"]
 
-        except Exception as e:
-             print(f"Warning: Failed to save to DB: {e}")
-             # Fallback if DB fails (shouldn't happen)
-             file_id = str(uuid.uuid4())
-             session_data = get_user_session(anonymous_user_id)
-             session_data["files"][file_id] = {
-                 "df": df, 
-                 "filename": final_filename,
-                 "path": tmp_path,
-                 "source": "url",
-                 "url": url
-             }
-             session_data["active_file_id"] = file_id
-
-        return clean_for_json({
-            "message": f"Connected! Loaded {len(df)} rows.", 
-            "file_id": file_id,
-            "filename": session_data["files"][file_id]["filename"],
-            "columns": list(df.columns), 
-            "preview": df.head(5).to_dict(orient="records")
-        })
+        if len(loading) == 1:
+            job, file_info = loading[0]
+            return await ingest_response(job, file_info, "Connected! Loaded {rows} rows.", background)
+
+        results = await asyncio.gather(
+            *(ingest_result(job, file_info, "Loaded {rows} rows.", background) for job, file_info in loading),
+            return_exceptions=True
+        )
+        files, status_code = [], 200
+        for (job, file_info), result in zip(loading, results):
+            if isinstance(result, HTTPException):
+                files.append({"file_id": file_info["id"], "filename": file_info["filename"],
+                              "job_id": job.id, "status": job.status, "error": result.detail})
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            code, body = result
+            status_code = max(status_code, code)
+            files.append(body)
+        return FastJSONResponse({
+            "message": f"Connected! Imported {len(files)} tabs.",
+            "file_id": files[0]["file_id"],
+            "files": files
+        }, status_code=status_code)
 
-    except requests.exceptions.Timeout:
+    except HTTPException:
+        raise
+    except SheetError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    except httpx.TimeoutException:
         raise HTTPException(status_code=400, detail="⏳ Connection Timed Out.")
     except Exception as e:
         import traceback
@@ -533,12 +539,99 @@ async def connect_url(
         print(f"❌ Error in connect_url: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to connect: {str(e)}")
 
+def ingest_upload(file_info: Dict[str, Any], job) -> Dict[str, Any]:
+    """Ingest job: chunked parse into the columnar copy on a worker process.
+
+    A streamed file stays on disk (the SQL engine scans its columnar copy; the pandas
+    path loads it lazily on first use). Only a frame the parser had to build in one go
+    anyway, because no columnar copy could be written, is kept in memory.
+    """
+    summary, df = job.run_in_process(functools.partial(ingest_file, return_frame=False), file_info["path"])
+    if file_info.get("deleted"):
+        # Deleted while it was parsing: the copy may have been written after the delete removed it
+        remove_columnar(file_info["path"])
+    job.report()
+    if df is not None:
+        set_dataframe(file_info, df)
+    return {"file_id": file_info["id"], **summary}
+
+def submit_ingest(user_id: int, file_info: Dict[str, Any]):
+    """Queues the ingest job for a new file, followed by its profile and warmup jobs.
+
+    Only transient errors are retried: a crashed parser process or an I/O error for
+    ingest, a locked database for the profile save. Parse errors fail at once.
+    """
+    def queue_warmup(_):
+        if not file_info.get("deleted"):
+            file_info["job_ids"].append(job_queue.submit(
+                "warmup", user_id, warmup_agent, user_id, file_info["id"], priority=PRIORITY_WARMUP).id)
+
+    def queue_profile(_):
+        if not file_info.get("deleted"):
+            file_info["job_ids"].append(job_queue.submit(
+                "profile", user_id, profile_dataset, file_info,
+                priority=PRIORITY_PROFILE, max_retries=JOB_MAX_RETRIES,
+                retry_on=(OperationalError,), on_success=queue_warmup).id)
+
+    job = job_queue.submit("ingest", user_id, ingest_upload, file_info, max_retries=JOB_MAX_RETRIES,
+                           retry_on=(BrokenProcessPool, OSError), on_success=queue_profile)
+    file_info["job_id"] = job.id
+    # The whole chain, cancelled together when the file is deleted (see forget_file)
+    file_info["job_ids"] = [job.id]
+    # Cleared once the job is over, whatever the outcome (also when cancelled while queued);
+    # after a failure the lazy loader in /chat retries with a plain full parse
+    job.future.add_done_callback(lambda _: file_info.update(ingesting=False))
+    return job
+
+async def ingest_result(job, file_info: Dict[str, Any], message: str, background: bool):
+    """(status code, body) of an ingest: waits for small files; large ones (or ?background=true) get 202."""
+    if background or os.path.getsize(file_info["path"]) > UPLOAD_ASYNC_THRESHOLD_MB * 1024 * 1024:
+        # Clients poll /jobs/{id} or stream /jobs/{id}/events
+        return 202, {
+            "message": "File accepted, loading in background",
+            "file_id": file_info["id"],
+            "filename": file_info["filename"],
+            "job_id": job.id,
+            "status": job.status
+        }
+
+    await asyncio.wrap_future(job.future)
+    if job.status == "cancelled":
+        raise HTTPException(status_code=409, detail="Loading was cancelled")
+    if job.status != "done":
+        raise HTTPException(status_code=500, detail=job.error)
+    df = file_info.get("df")
+    if df is None:
+        # Streamed to its columnar copy: answer from the ingest stats and the first rows on disk
+        preview = await run_in_threadpool(preview_columnar, file_info["path"])
+        rows, columns = job.result["rows"], list(job.result["columns"])
+    else:
+        preview, rows, columns = df.head(5), len(df), list(df.columns)
+
+    return 200, {
+        "message": message.format(rows=rows),
+        "file_id": file_info["id"],
+        "filename": file_info["filename"],
+        "job_id": job.id,
+        "columns": columns,
+        "preview": preview.to_dict(orient="records") if preview is not None else []
+    }
+
+async def ingest_response(job, file_info: Dict[str, Any], message: str, background: bool):
+    status_code, body = await ingest_result(job, file_info, message, background)
+    return FastJSONResponse(body, status_code=status_code)
+
+def ingest_status_message(file_info: Dict[str, Any]) -> str:
+    job = job_queue.get(file_info.get("job_id", ""))
+    percent = job.progress.get("percent", 0) if job else 0
+    return f"⏳ {file_info['filename']} is still loading ({percent}% done). Please ask again in a moment."
+
 @app.post("/upload")
 async def upload_file(
     request: Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...), 
-    session: Session = Depends(get_session)
+    background: bool = False,
+    session: AsyncSession = Depends(get_async_session)
 ):
     try:
         # Get user ID from session
@@ -549,14 +642,7 @@ async def upload_file(
         
         file_path = os.path.join(upload_dir, file.filename)
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-            
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path, on_bad_lines='skip')
-        else:
-            df = pd.read_excel(file_path)
-            
-        df = sanitize_dataframe(df)
+            await run_in_threadpool(shutil.copyfileobj, file.file, buffer, UPLOAD_COPY_BUFFER)
         
         # SAVE TO DB FIRST
         db_record = AnalysisSession(
@@ -565,106 +651,233 @@ async def upload_file(
             file_name=file.filename
         )
         session.add(db_record)
-        session.commit()
-        session.refresh(db_record)
+        await session.commit()
+        await session.refresh(db_record)
         
         file_id = str(db_record.id) # Use Stable DB ID
         
-        session_data = get_user_session(user_id)
-        session_data["files"][file_id] = {
-            "df": df,
+        session_data = await run_in_threadpool(get_user_session, user_id)
+        file_info = {
+            "id": file_id,
+            "df": None,
             "filename": file.filename,
             "path": file_path,
             "source": "file",
-            "timestamp": os.path.getmtime(file_path)
+            "timestamp": os.path.getmtime(file_path),
+            "ingesting": True
         }
+        await run_in_threadpool(session_meta.put_file, user_id, file_info)
+        session_data["files"][file_id] = file_info
         session_data["active_file_id"] = file_id
 
-        # SCHEDULE WARMUP
-        background_tasks.add_task(warmup_agent, user_id, file_id)
-        
-        return clean_for_json({
-            "message": "File Uploaded", 
-            "file_id": file_id,
-            "filename": file.filename,
-            "columns": list(df.columns), 
-            "preview": df.head(5).to_dict(orient="records")
-        })
+        # Parse off the event loop; profile and warm the agent once the data is in
+        job = submit_ingest(user_id, file_info)
+        return await ingest_response(job, file_info, "File Uploaded", background)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat")
-async def chat(request_body: QueryRequest, request: Request):
-    # Get user ID from session
-    user_id = get_session_user_id(request)
-    session_data = get_user_session(user_id)
-    target_file_id = request_body.file_id or session_data.get("active_file_id")
-    
-    if not target_file_id or target_file_id not in session_data["files"]:
-        raise HTTPException(status_code=400, detail="No active file selected. Please upload a file.")
-    
-    file_info = session_data["files"][target_file_id]
-    
-    # LAZY LOADING
-    if file_info.get("df") is None:
-        print(f"💤 Lazy Loading dataframe for {file_info['filename']}...")
-        if file_info["path"].endswith('.csv'):
-            file_info["df"] = sanitize_dataframe(pd.read_csv(file_info["path"], on_bad_lines='skip'))
-        else:
-            file_info["df"] = sanitize_dataframe(pd.read_excel(file_info["path"]))
+def get_user_job(job_id: str, request: Request):
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != get_session_user_id(request):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, request: Request):
+    return FastJSONResponse(get_user_job(job_id, request).to_dict())
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str, request: Request):
+    """Cancels a queued job, or stops a running one at its next progress checkpoint."""
+    job = get_user_job(job_id, request)
+    if not job_queue.cancel(job.id):
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    return FastJSONResponse(job.to_dict())
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, request: Request):
+    """Server-Sent Events feed of a job's progress until it finishes."""
+    job = get_user_job(job_id, request)
+
+    async def event_stream():
+        last_update = None
+        while True:
+            if job.updated_at != last_update:
+                last_update = job.updated_at
+                yield sse_event(job.status if job.status in TERMINAL_STATES else "progress", job.to_dict())
+            if job.status in TERMINAL_STATES:
+                return
+            await asyncio.sleep(JOB_EVENTS_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def set_dataframe(file_info: Dict[str, Any], df):
+    """Swaps in a new snapshot and drops cached results computed against the old one."""
+    old_fingerprint = file_info.get("fingerprint")
+    file_info["df"] = df
+    file_info["fingerprint"] = dataset_fingerprint(df)
+    if old_fingerprint and old_fingerprint != file_info["fingerprint"]:
+        print("♻️  Data changed, invalidating cached results")
+        result_cache.invalidate(old_fingerprint)
+    session_store.track(file_info)
+
+def apply_url_refresh(file_info: Dict[str, Any], body: bytes):
+    """Swaps in new content fetched for a URL source (runs on the refresh thread)."""
+    print(f"♻️  Source changed for {file_info['filename']}, reloading...")
+    df = sanitize_dataframe(pd.read_csv(BytesIO(body), on_bad_lines='skip'))
+    with file_locks.hold(file_info["id"]):
+        if file_info.get("path"):
+            # Keep the on-disk snapshot current so lazy reloads see the new data
+            with open(file_info["path"], "wb") as f:
+                f.write(body)
+            write_columnar(df, file_info["path"])
+        set_dataframe(file_info, df)
+
+def prepare_agent(file_info: Dict[str, Any], load_df: bool = True):
+    """Lazy-loads the file's DataFrame and applies the auto-refresh checks. Blocking.
+
+    With `load_df=False` a file whose columnar copy is current stays on disk (the SQL
+    engine scans it directly).
+    """
+    session_store.record_access(file_info)
+
+    # LAZY LOADING (one loader per file; concurrent requests wait and reuse its result)
+    if file_info.get("df") is None and (load_df or not can_scan_columnar(file_info.get("path"))):
+        with file_locks.hold(file_info["id"]):
+            if file_info.get("df") is None:
+                print(f"💤 Lazy Loading dataframe for {file_info['filename']}...")
+                set_dataframe(file_info, load_dataframe(file_info["path"]))
+    elif file_info.get("fingerprint") is None and file_info.get("df") is not None:
+        file_info["fingerprint"] = dataset_fingerprint(file_info["df"])
     
     # AUTO REFRESH
     try:
         if file_info["source"] == "url" and file_info.get("url"):
-             res = requests.get(file_info["url"])
-             res.raise_for_status()
-             res.raise_for_status()
-             file_info["df"] = sanitize_dataframe(pd.read_csv(StringIO(res.text)))
-             file_info["sdf"] = None # Invalidate cache
+            # Answer from the current snapshot; re-check the source in the background once the TTL expires
+            if url_refresh.schedule(file_info, apply_url_refresh):
+                print(f"🔄 Checking {file_info['filename']} for updates in the background")
         elif file_info["source"] == "file" and file_info.get("path"):
             current_mtime = os.path.getmtime(file_info["path"])
-            last_ts = file_info.get("timestamp", 0)
-            if current_mtime > last_ts:
-                print("File change detected! Reloading...")
-                if file_info["path"].endswith('.csv'): 
-                    new_df = pd.read_csv(file_info["path"])
-                else: 
-                    new_df = pd.read_excel(file_info["path"])
-                file_info["df"] = sanitize_dataframe(new_df)
-                file_info["timestamp"] = current_mtime
-                file_info["sdf"] = None # Invalidate cache
+            if current_mtime > file_info.get("timestamp", 0) and file_info.get("df") is not None:
+                with file_locks.hold(file_info["id"]):
+                    # Re-check: a concurrent request may have reloaded it meanwhile
+                    if current_mtime > file_info.get("timestamp", 0):
+                        print("File change detected! Reloading...")
+                        set_dataframe(file_info, load_dataframe(file_info["path"]))
+                        file_info["timestamp"] = current_mtime
     except Exception as e:
         print(f"Warning: Auto-refresh failed: {e}")
 
-    # Detect domain context and format (needed for instructions)
-    domain_context = detect_domain_context(file_info["df"])
-    is_wide_format = detect_wide_format_dates(file_info["df"])
+def ensure_agent(file_info: Dict[str, Any]):
+    """Returns the pooled SmartDataframe for the file's current version, building it if needed."""
+    return agent_pool.get(file_info)
+
+def load_stored_profile(file_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not file_id or not str(file_id).isdigit():
+        return None
+    with Session(engine) as db:
+        record = db.exec(select(DatasetProfile).where(DatasetProfile.session_id == int(file_id))).first()
+        return dict(record.profile, fingerprint=record.fingerprint) if record else None
+
+def save_profile(file_id: Optional[str], profile: Dict[str, Any]):
+    if not file_id or not str(file_id).isdigit():
+        return
+    try:
+        with Session(engine) as db:
+            record = db.exec(select(DatasetProfile).where(DatasetProfile.session_id == int(file_id))).first()
+            if record is None:
+                record = DatasetProfile(session_id=int(file_id), fingerprint=profile["fingerprint"])
+            record.fingerprint = profile["fingerprint"]
+            record.profile = profile
+            record.updated_at = datetime.utcnow()
+            db.add(record)
+            db.commit()
+    except Exception as e:
+        print(f"Warning: Failed to save dataset profile: {e}")
+
+def ensure_profile(file_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns the profile for the file's current version, computing and storing it at most once."""
+    fingerprint = file_info.get("fingerprint")
+
+    # Without a loaded snapshot (fingerprint unknown) any stored profile is the best we have
+    profile = file_info.get("profile")
+    if profile is not None and (fingerprint is None or profile.get("fingerprint") == fingerprint):
+        return profile
+    stored = load_stored_profile(file_info.get("id"))
+    if stored is not None and (fingerprint is None or stored.get("fingerprint") == fingerprint):
+        file_info["profile"] = stored
+        return stored
+
+    with file_locks.hold(file_info["id"]):
+        # Another request may have profiled this version while we waited
+        profile = file_info.get("profile")
+        if profile is not None and profile.get("fingerprint") == file_info.get("fingerprint"):
+            return profile
+
+        print(f"📊 Profiling {file_info['filename']}...")
+        profile = None
+        if file_info.get("df") is None and can_scan_columnar(file_info.get("path")):
+            # Profile the on-disk copy without keeping the frame resident
+            profile = profile_columnar(file_info["path"])
+        if profile is None:
+            if file_info.get("df") is None:
+                prepare_agent(file_info)
+            if file_info.get("fingerprint") is None:
+                file_info["fingerprint"] = dataset_fingerprint(file_info["df"])
+            profile = build_profile(file_info["df"])
+            profile["fingerprint"] = file_info["fingerprint"]
+        store_profile(file_info, profile)
+    return profile
+
+def store_profile(file_info: Dict[str, Any], profile: Dict[str, Any]):
+    file_info["profile"] = profile
+    file_info["fingerprint"] = profile["fingerprint"]
+    # A file deleted while it was being profiled must not get its row back
+    if not file_info.get("deleted"):
+        save_profile(file_info.get("id"), profile)
+
+def profile_file(file_info: Dict[str, Any]) -> Dict[str, Any]:
+    with session_store.pinned(file_info):
+        return ensure_profile(file_info)
+
+def profile_dataset(file_info: Dict[str, Any], job=None):
+    """Profile job: profiles a freshly uploaded/connected file.
+
+    A file that is only on disk is profiled from its columnar copy on a worker process.
+    """
+    try:
+        if file_info.get("df") is None and job is not None and can_scan_columnar(file_info.get("path")):
+            profile = job.run_in_process(profile_columnar, file_info["path"])
+            job.report()
+            with file_locks.hold(file_info["id"]):
+                # Unless the data was reloaded (and changed) while the copy was profiled
+                if profile is not None and file_info.get("fingerprint") in (None, profile["fingerprint"]):
+                    store_profile(file_info, profile)
+                    return
+        profile_file(file_info)
+    except Exception as e:
+        print(f"⚠️ Profiling failed: {e}")
+        raise
+
+# Bump whenever build_instructions() changes so cached results are not reused
+PROMPT_VERSION = "1"
+
+def build_instructions(profile: Dict[str, Any]) -> str:
+    # Domain context and format come from the precomputed dataset profile
+    domain_context = profile["domain_context"]
     wide_format_hint = ""
-    if is_wide_format:
+    if profile["is_wide_format"]:
         wide_format_hint = "\nDATA STRUCTURE HINT: Wide Format Time Series."
 
-    # CHECK FOR CACHED AGENT
-    if "sdf" not in file_info or file_info.get("sdf") is None:
-        print(f"🤖 Initializing new SmartDataframe Agent for {file_info['filename']}...")
-        api_key = os.getenv("OPENAI_API_KEY")
-        # USE FASTER MODEL
-        llm = OpenAI(api_token=api_key, model="gpt-4o-mini")
-        
-        file_info["sdf"] = SmartDataframe(file_info["df"], config={
-            "llm": llm, 
-            "save_charts": False, 
-            "open_charts": False, 
-            "enable_cache": True,
-            "custom_whitelisted_dependencies": ["json"]
-        })
-    else:
-        print("⚡ Reusing cached SmartDataframe Agent")
-
-    sdf = file_info["sdf"]
-    
-    instructions = f"""
+    return f"""
     You are an intelligent Data Analytics Engine.
     CONTEXT: {domain_context}
     {wide_format_hint}
@@ -682,66 +895,277 @@ async def chat(request_body: QueryRequest, request: Request):
     - A single widget object: {{ "vis_type": "...", "payload": ... }}
     - OR a LIST of widgets: [ {{ "vis_type": "...", ... }}, {{ "vis_type": "...", ... }} ]
     """
+
+def normalize_response(response) -> Dict[str, Any]:
+    """Turns the raw agent answer into the {"type": ..., "payload": ...} shape the frontend renders."""
+    if isinstance(response, dict) and "type" in response and "value" in response:
+        if response["type"] == "string":
+            response = response["value"]
     
-    try:
-        response = sdf.chat(request_body.query + instructions)
-        
-        if isinstance(response, dict) and "type" in response and "value" in response:
-            if response["type"] == "string":
-                response = response["value"]
+    if isinstance(response, (dict, list)):
+        data = response
+    else:
+        clean_str = re.sub(r"```json|```", "", str(response)).strip()
+        try:
+            data = json.loads(clean_str)
+        except:
+            try: data = ast.literal_eval(clean_str)
+            except: return {"type": "text", "payload": clean_str}
+
+    # FIX: Handle case where LLM returns dict with 'kpi'/'chart' keys instead of list
+    if isinstance(data, dict) and ('kpi' in data or 'chart' in data):
+        new_list = []
+        if 'kpi' in data: new_list.append(data['kpi'])
+        if 'chart' in data: new_list.append(data['chart'])
+        data = new_list
+
+    # Validate and Fix Widgets
+    final_widgets = []
+    if isinstance(data, list):
+        final_widgets = data
+    elif isinstance(data, dict):
+        if "vis_type" in data:
+            final_widgets = [data]
+        elif "type" in data:
+             vis_type = "kpi" if data["type"] == "kpi" else "chart"
+             final_widgets = [{"vis_type": vis_type, "payload": data}]
+    
+    # Post-process widgets to ensure frontend compatibility
+    for widget in final_widgets:
+        if widget.get("vis_type") == "chart":
+            if "payload" in widget and isinstance(widget["payload"], dict):
+                # Default missing type to 'bar'
+                if "type" not in widget["payload"]:
+                    widget["payload"]["type"] = "bar"
+                # Normalize type
+                widget["payload"]["type"] = str(widget["payload"]["type"]).lower()
+                
+                # Map common aliases
+                if widget["payload"]["type"] == "column": 
+                    widget["payload"]["type"] = "bar"
+
+                # Cap points per chart type so huge generated payloads stay renderable
+                downsample_widget(widget)
+    
+    if final_widgets:
+         print(f"✅ Returning {len(final_widgets)} widgets: {dumps(final_widgets[:1])[:200].decode(errors='ignore')}...")
+         return {"type": "dashboard", "payload": final_widgets}
         
-        if isinstance(response, (dict, list)):
-            data = response
+    return {"type": "text", "payload": str(data)}
+
+def run_analysis(file_info: Dict[str, Any], query: str, progress: Optional[Callable[..., None]] = None,
+                 engine: Optional[str] = None) -> Dict[str, Any]:
+    """Worker-side half of /chat: refreshes data, serves cached results or runs the agent.
+
+    `progress(event, data)` is called at each stage for the streaming endpoint. With the
+    "sql" engine the question is answered by LLM-generated SQL on DuckDB, which reads
+    the columnar copy directly when the DataFrame isn't loaded.
+    """
+    def report(event: str, **data):
+        if progress is not None:
+            progress(event, data)
+
+    use_sql = sql_enabled(engine)
+    with session_store.pinned(file_info):
+        prepare_agent(file_info, load_df=not use_sql)
+        df = file_info["df"]
+        # Left on disk for DuckDB: the stored profile stands in for the DataFrame
+        profile = ensure_profile(file_info) if df is None else None
+        if df is not None:
+            report("dataset_loaded", filename=file_info["filename"], rows=len(df), columns=len(df.columns))
         else:
-            clean_str = re.sub(r"```json|```", "", str(response)).strip()
-            try:
-                data = json.loads(clean_str)
-            except:
-                try: data = ast.literal_eval(clean_str)
-                except: return {"type": "text", "payload": clean_str}
-
-        # FIX: Handle case where LLM returns dict with 'kpi'/'chart' keys instead of list
-        if isinstance(data, dict) and ('kpi' in data or 'chart' in data):
-            new_list = []
-            if 'kpi' in data: new_list.append(data['kpi'])
-            if 'chart' in data: new_list.append(data['chart'])
-            data = new_list
-
-        # Validate and Fix Widgets
-        final_widgets = []
-        if isinstance(data, list):
-            final_widgets = data
-        elif isinstance(data, dict):
-            if "vis_type" in data:
-                final_widgets = [data]
-            elif "type" in data:
-                 vis_type = "kpi" if data["type"] == "kpi" else "chart"
-                 final_widgets = [{"vis_type": vis_type, "payload": data}]
-        
-        # Post-process widgets to ensure frontend compatibility
-        for widget in final_widgets:
-            if widget.get("vis_type") == "chart":
-                if "payload" in widget and isinstance(widget["payload"], dict):
-                    # Default missing type to 'bar'
-                    if "type" not in widget["payload"]:
-                        widget["payload"]["type"] = "bar"
-                    # Normalize type
-                    widget["payload"]["type"] = str(widget["payload"]["type"]).lower()
-                    
-                    # Map common aliases
-                    if widget["payload"]["type"] == "column": 
-                        widget["payload"]["type"] = "bar"
-        
-        if final_widgets:
-             print(f"✅ Returning {len(final_widgets)} widgets: {json.dumps(final_widgets, default=str)[:200]}...")
-             return clean_for_json({"type": "dashboard", "payload": final_widgets})
-            
-        return clean_for_json({"type": "text", "payload": str(data)})
+            report("dataset_loaded", filename=file_info["filename"], rows=profile["rows"], columns=len(profile["columns"]))
+
+        fingerprint = file_info.get("fingerprint") or profile["fingerprint"]
+        prompt_version = f"{PROMPT_VERSION}/sql{SQL_PROMPT_VERSION}" if use_sql else PROMPT_VERSION
+        cache_key = ResultCache.make_key(fingerprint, query, prompt_version)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Result cache hit for {file_info['filename']}")
+            report("cache_hit")
+            return cached
+
+        def analyze() -> Dict[str, Any]:
+            # Deterministic pandas answer for common intents; the agent is the fallback
+            fast_result = try_fast_path(query, df) if df is not None else None
+            if fast_result is not None:
+                print(f"⚡ Fast path answered without the LLM for {file_info['filename']}")
+                report("fast_path")
+                return fast_result
+
+            if use_sql:
+                report("executing", engine="sql")
+                result = answer_with_sql(file_info, query, profile or ensure_profile(file_info))
+            else:
+                sdf = ensure_agent(file_info)
+                report("agent_ready")
+                instructions = build_instructions(ensure_profile(file_info))
+                report("executing")
+                response = sdf.chat(query + instructions)
+                report("code_executed", code=getattr(sdf, "last_code_generated", None))
+                result = normalize_response(response)
+
+            # Only successful dashboards are worth replaying; text may be an error message
+            if result["type"] == "dashboard":
+                result_cache.put(cache_key, result)
+            return result
+
+        # The same question on the same data already running elsewhere: wait for its answer
+        result, shared = query_flights.do(cache_key, analyze)
+        if shared:
+            print(f"🔗 Reused an identical in-flight analysis for {file_info['filename']}")
+            report("coalesced")
+        return result
+
+def run_cross_file_analysis(file_infos: List[Dict[str, Any]], query: str,
+                            progress: Optional[Callable[..., None]] = None, engine: Optional[str] = None) -> Dict[str, Any]:
+    """Worker-side half of a multi-file /chat: each file becomes a DuckDB table and joins run in SQL.
+
+    Files stay on disk when their columnar copy is current; the stored profiles supply
+    the schema summaries and join keys.
+    """
+    def report(event: str, **data):
+        if progress is not None:
+            progress(event, data)
+
+    with ExitStack() as stack:
+        for file_info in file_infos:
+            stack.enter_context(session_store.pinned(file_info))
+        profiles = []
+        for file_info in file_infos:
+            prepare_agent(file_info, load_df=False)
+            profiles.append(ensure_profile(file_info))
+        report("dataset_loaded", filenames=[f["filename"] for f in file_infos], rows=[p["rows"] for p in profiles])
+
+        fingerprints = [f.get("fingerprint") or p["fingerprint"] for f, p in zip(file_infos, profiles)]
+        prompt_version = f"{PROMPT_VERSION}/sql{SQL_PROMPT_VERSION}/" + ",".join(fingerprints[1:])
+        cache_key = ResultCache.make_key(fingerprints[0], query, prompt_version)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Result cache hit for {len(file_infos)} files")
+            report("cache_hit")
+            return cached
+
+        def analyze() -> Dict[str, Any]:
+            report("executing", engine="sql")
+            result = answer_across_files(file_infos, query, profiles)
+            if result["type"] == "dashboard":
+                result_cache.put(cache_key, result)
+            return result
+
+        result, shared = query_flights.do(cache_key, analyze)
+        if shared:
+            print(f"🔗 Reused an identical in-flight analysis for {len(file_infos)} files")
+            report("coalesced")
+        return result
+
+def resolve_analysis(request_body: QueryRequest, session_data: Dict[str, Any]):
+    """Picks the files a /chat request targets and the worker function that answers it."""
+    file_ids = list(dict.fromkeys(request_body.file_ids or []))
+    if len(file_ids) > 1:
+        if not HAS_DUCKDB:
+            raise HTTPException(status_code=400, detail="Cross-file questions need the SQL engine (duckdb) installed.")
+        missing = [fid for fid in file_ids if fid not in session_data["files"]]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown file ids: {', '.join(missing)}")
+        file_infos = [session_data["files"][fid] for fid in file_ids]
+        return run_cross_file_analysis, file_infos, file_infos
+
+    target_file_id = (file_ids[0] if file_ids else request_body.file_id) or session_data.get("active_file_id")
+    if not target_file_id or target_file_id not in session_data["files"]:
+        raise HTTPException(status_code=400, detail="No active file selected. Please upload a file.")
+    file_info = session_data["files"][target_file_id]
+    return run_analysis, file_info, [file_info]
+
+@app.post("/chat")
+async def chat(request_body: QueryRequest, request: Request):
+    # Get user ID from session
+    user_id = get_session_user_id(request)
+    session_data = await run_in_threadpool(get_user_session, user_id)
+    analyze, target, file_infos = resolve_analysis(request_body, session_data)
 
+    for file_info in file_infos:
+        if file_info.get("ingesting"):
+            return FastJSONResponse({"type": "text", "payload": ingest_status_message(file_info)})
+
+    try:
+        # Blocking load + LLM work runs on the bounded analysis pool
+        result = await analysis_pool.run(user_id, analyze, target, request_body.query, None, request_body.engine)
+        return FastJSONResponse(result)
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error: {e}")
         return {"type": "text", "payload": f"Analysis failed: {str(e)}"}
 
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(request_body: QueryRequest, request: Request):
+    """Server-Sent Events variant of /chat: progress events, then one event per widget."""
+    user_id = get_session_user_id(request)
+    session_data = await run_in_threadpool(get_user_session, user_id)
+    analyze, target, file_infos = resolve_analysis(request_body, session_data)
+
+    for file_info in file_infos:
+        if file_info.get("ingesting"):
+            raise HTTPException(status_code=409, detail=ingest_status_message(file_info))
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def progress(event: str, data: Dict[str, Any]):
+        loop.call_soon_threadsafe(events.put_nowait, (event, data))
+
+    # Admission happens here so saturation still surfaces as a 429/503 status
+    job = analysis_pool.start(user_id, analyze, target, request_body.query, progress, request_body.engine)
+
+    async def event_stream():
+        yield sse_event("accepted", {"file_id": file_infos[0]["id"], "file_ids": [f["id"] for f in file_infos]})
+        
+        # Relay progress until the worker finishes; a client disconnect cancels this generator
+        while not job.done():
+            next_event = asyncio.ensure_future(events.get())
+            await asyncio.wait({next_event, job}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event.done():
+                yield sse_event(*next_event.result())
+            else:
+                next_event.cancel()
+        while not events.empty():
+            yield sse_event(*events.get_nowait())
+
+        try:
+            result = job.result()
+        except Exception as e:
+            print(f"Error: {e}")
+            yield sse_event("error", {"payload": f"Analysis failed: {str(e)}"})
+            return
+
+        if result["type"] == "dashboard":
+            for index, widget in enumerate(result["payload"]):
+                yield sse_event("widget", {"index": index, "widget": widget})
+        else:
+            yield sse_event("text", {"payload": result["payload"]})
+        yield sse_event("done", {"type": result["type"]})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "analysis_pool": analysis_pool.stats(),
+        "result_cache": result_cache.stats(),
+        "session_store": session_store.stats(),
+        "jobs": job_queue.stats(),
+        "sql_engine": sql_engine.stats(),
+        "agent_pool": agent_pool.stats(),
+        "auth_cache": auth_cache.stats(),
+        "file_locks": file_locks.stats(),
+        "query_flights": query_flights.stats(),
+    }
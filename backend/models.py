@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field, Relationship, Column, JSON
+from sqlalchemy import Index
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -12,6 +13,9 @@ class User(SQLModel, table=True):
     widgets: List["Widget"] = Relationship(back_populates="user")
 
 class AnalysisSession(SQLModel, table=True):
+    # Per-user file lookups (session restore, delete by path)
+    __table_args__ = (Index("ix_analysissession_user_id_file_path", "user_id", "file_path"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     file_path: str
@@ -22,6 +26,9 @@ class AnalysisSession(SQLModel, table=True):
     user: Optional[User] = Relationship(back_populates="sessions")
 
 class Widget(SQLModel, table=True):
+    # Dashboard: a user's widgets, newest first, straight from the index
+    __table_args__ = (Index("ix_widget_user_id_created_at", "user_id", "created_at"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
     title: str
@@ -31,3 +38,18 @@ class Widget(SQLModel, table=True):
     
     # Relationship
     user: Optional[User] = Relationship(back_populates="widgets")
+
+class DatasetProfile(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    session_id: int = Field(foreign_key="analysissession.id", unique=True, index=True)
+    fingerprint: str
+    profile: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class SessionState(SQLModel, table=True):
+    # Per-user file list shared by all worker processes (see backend/session_meta.py)
+    user_id: int = Field(primary_key=True)
+    active_file_id: Optional[str] = None
+    version: int = 0
+    files: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+import pandas as pd
+
+from backend.responses import dumps
+
+# --- CONFIG ---
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+RESULT_CACHE_DIR = os.getenv(
+    "RESULT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "analytics_ai_cache", "results")
+)
+RESULT_CACHE_DISK = os.getenv("RESULT_CACHE_DISK", "1") == "1"
+RESULT_CACHE_DISK_MAX_MB = int(os.getenv("RESULT_CACHE_DISK_MAX_MB", "512"))
+RESULT_CACHE_DISK_MAX_AGE = float(os.getenv("RESULT_CACHE_DISK_MAX_AGE", str(7 * 24 * 3600)))
+RESULT_CACHE_PRUNE_EVERY = 64  # puts between two scans of the disk tier
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (values, index, column names and dtypes)."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in df.columns]).encode())
+    digest.update(json.dumps([str(t) for t in df.dtypes]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    except TypeError:
+        # Unhashable cells (lists/dicts) -> fall back to the CSV rendering
+        digest.update(df.to_csv(index=True).encode())
+    return digest.hexdigest()[:32]
+
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace-insensitive form of a question, without trailing punctuation."""
+    return re.sub(r"\s+", " ", query).strip().lower().rstrip("?.! ")
+
+
+class ResultCache:
+    """Two-tier (memory LRU + JSON on disk) cache of post-processed /chat results.
+
+    Keys are content addressed: dataset fingerprint + normalized query + prompt version.
+    Entries on disk are stored as `<fingerprint>_<key>.json` so everything computed
+    against an outdated snapshot can be dropped with `invalidate(fingerprint)`. The disk
+    tier is bounded too: entries older than `max_age` seconds go, then the least recently
+    used ones (by mtime, refreshed on every disk hit) until it fits in `max_disk_bytes`.
+    """
+
+    def __init__(self, max_entries: int, cache_dir: Optional[str] = None,
+                 max_disk_bytes: int = RESULT_CACHE_DISK_MAX_MB * 1024 * 1024,
+                 max_age: float = RESULT_CACHE_DISK_MAX_AGE):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_age = max_age
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.disk_evictions = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.prune()
+
+    @staticmethod
+    def make_key(fingerprint: str, query: str, prompt_version: str) -> str:
+        raw = f"{fingerprint}\x00{normalize_query(query)}\x00{prompt_version}"
+        return f"{fingerprint}_{hashlib.sha256(raw.encode()).hexdigest()[:32]}"
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _remember(self, key: str, value: Dict[str, Any]):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        if self.cache_dir:
+            try:
+                with open(self._disk_path(key), "rb") as f:
+                    value = orjson.loads(f.read())
+                os.utime(self._disk_path(key))  # recency for prune()
+                with self._lock:
+                    self._remember(key, value)
+                    self.disk_hits += 1
+                return value
+            except (OSError, ValueError):
+                pass
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._remember(key, value)
+
+        if self.cache_dir:
+            tmp_path = self._disk_path(key) + ".tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(dumps(value))
+                os.replace(tmp_path, self._disk_path(key))
+            except (OSError, TypeError, ValueError) as e:
+                print(f"Warning: Could not persist cached result: {e}")
+            with self._lock:
+                self._puts += 1
+                due = self._puts % RESULT_CACHE_PRUNE_EVERY == 0
+            if due:
+                self.prune()
+
+    def prune(self):
+        """Bounds the disk tier by age, then by total size (least recently used first)."""
+        entries = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.json")):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        cutoff = time.time() - self.max_age
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self.disk_evictions += 1
+
+    def invalidate(self, fingerprint: str):
+        """Drops every entry computed against the dataset snapshot `fingerprint`."""
+        prefix = f"{fingerprint}_"
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefix)]:
+                del self._memory[key]
+
+        if self.cache_dir:
+            for path in glob.glob(os.path.join(self.cache_dir, f"{prefix}*.json")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "disk_evictions": self.disk_evictions,
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_DIR if RESULT_CACHE_DISK else None)
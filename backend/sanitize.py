@@ -0,0 +1,76 @@
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# --- CONFIG ---
+DATE_PROBE_SIZE = int(os.getenv("DATE_PROBE_SIZE", "200"))
+DATE_PROBE_MIN_MATCH = float(os.getenv("DATE_PROBE_MIN_MATCH", "0.9"))
+
+
+def _probe_date_format(series: pd.Series):
+    """Guesses a datetime format from a sample of `series`, or returns None.
+
+    Only the sample is parsed; the full column is converted once, with the
+    detected format, if at least DATE_PROBE_MIN_MATCH of the sample matched
+    and no value of the column fails to parse.
+    """
+    values = series.dropna()
+    if values.empty:
+        return None
+    if len(values) > DATE_PROBE_SIZE:
+        values = values.sample(DATE_PROBE_SIZE, random_state=0)
+    values = values.astype(str)
+
+    fmt = guess_datetime_format(values.iloc[0])
+    if fmt is None:
+        return None
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    if parsed.notna().mean() < DATE_PROBE_MIN_MATCH:
+        return None
+    return fmt
+
+
+def sanitize_dataframe(df, date_formats: Optional[Dict[str, str]] = None):
+    """Normalizes a freshly parsed DataFrame in place, keeping native dtypes.
+
+    NaN is left in numeric columns; it is turned into null when the response
+    is serialized (see backend.responses), not by converting columns to object.
+    The detected date formats are recorded in `df.attrs["date_formats"]`; pass
+    them back as `date_formats` to convert later chunks of the same file
+    identically instead of probing each chunk.
+    """
+    # 1. Strip whitespace
+    df.columns = [str(c).strip() for c in df.columns]
+    detected = {}
+
+    for col in df.columns:
+        series = df[col]
+
+        # 2. Convert Dates (text columns only, format probed on a sample)
+        if ("date" in col.lower() or "time" in col.lower()) and pd.api.types.is_string_dtype(series.dtype):
+            fmt = date_formats.get(col) if date_formats is not None else _probe_date_format(series)
+            if fmt is not None:
+                converted = pd.to_datetime(series, format=fmt, errors="coerce")
+                # The sample can miss values in another format; never turn real values into NaT
+                if converted.notna().sum() == series.notna().sum():
+                    df[col] = converted
+                    detected[col] = fmt
+                else:
+                    print(f"Warning: Kept '{col}' as text; some values don't match the date format {fmt}")
+            continue
+
+        # 3. inf has no JSON/analytics meaning; fold it into NaN without a frame copy
+        if pd.api.types.is_float_dtype(series.dtype):
+            values = series.to_numpy()
+            if np.isinf(values).any():
+                df[col] = series.mask(np.isinf(values))
+
+    df.attrs["date_formats"] = detected
+    return df
@@ -0,0 +1,121 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from backend.database import engine
+from backend.models import SessionState
+
+# --- CONFIG ---
+SESSION_META_RETRIES = int(os.getenv("SESSION_META_RETRIES", "5"))
+
+# File metadata every worker needs; DataFrames, fingerprints, agents and job state
+# (e.g. "ingesting") stay per process, so a crashed ingest can't leave a flag behind
+PERSISTED_KEYS = ("id", "filename", "path", "source", "url", "etag", "last_modified", "content_hash")
+# Kept by each worker once known: its own refresh checks are newer than what it last read
+VALIDATOR_KEYS = ("etag", "last_modified", "content_hash")
+USER_ID_RANGE = 2**31 - 1  # fits a 32-bit INTEGER column on any backend
+
+
+def user_id_for(session_id: str) -> int:
+    """Stable integer user id of a session id, identical in every process and across restarts."""
+    digest = hashlib.blake2b(session_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % USER_ID_RANGE
+
+
+def file_meta(file_info: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: file_info[k] for k in PERSISTED_KEYS if k in file_info}
+
+
+def version(user_id: int) -> Optional[int]:
+    """Current version of the user's shared state (None if it was never stored). One PK lookup."""
+    with Session(engine) as db:
+        return db.exec(select(SessionState.version).where(SessionState.user_id == user_id)).first()
+
+
+def load(user_id: int) -> Optional[SessionState]:
+    with Session(engine) as db:
+        return db.get(SessionState, user_id)
+
+
+def mutate(user_id: int, change: Callable[[Dict[str, Any]], None]) -> int:
+    """Applies `change(state)` to the stored {"files", "active_file_id"} and returns the new version.
+
+    Optimistic concurrency: the write only lands if nobody else bumped the version since
+    it was read, otherwise the change is re-applied to the fresh state.
+    """
+    for _ in range(SESSION_META_RETRIES):
+        with Session(engine) as db:
+            row = db.get(SessionState, user_id)
+            current = row.version if row else 0
+            state = {
+                "files": dict(row.files or {}) if row else {},
+                "active_file_id": row.active_file_id if row else None,
+            }
+            change(state)
+            try:
+                if row is None:
+                    db.add(SessionState(user_id=user_id, version=1, **state))
+                    db.commit()
+                    return 1
+                result = db.exec(
+                    update(SessionState)
+                    .where(SessionState.user_id == user_id, SessionState.version == current)
+                    .values(version=current + 1, updated_at=datetime.utcnow(), **state)
+                )
+                db.commit()
+                if result.rowcount == 1:
+                    return current + 1
+            except IntegrityError:
+                db.rollback()
+    raise RuntimeError(f"Session state of user {user_id} kept changing; giving up")
+
+
+def put_file(user_id: int, file_info: Dict[str, Any], make_active: bool = True) -> int:
+    """Adds or updates a file in the shared state (optionally making it the active one)."""
+    meta = file_meta(file_info)
+
+    def change(state):
+        state["files"][meta["id"]] = meta
+        if make_active:
+            state["active_file_id"] = meta["id"]
+
+    return mutate(user_id, change)
+
+
+def drop_file(user_id: int, file_id: str) -> int:
+    def change(state):
+        state["files"].pop(file_id, None)
+        if state["active_file_id"] == file_id:
+            state["active_file_id"] = None
+
+    return mutate(user_id, change)
+
+
+def sync(session_data: Dict[str, Any], row: SessionState, on_remove: Callable[[Dict[str, Any]], None]):
+    """Brings a worker's in-memory session up to the stored state.
+
+    Files added elsewhere are registered for lazy loading (from the shared columnar cache),
+    files deleted elsewhere are dropped through `on_remove`, and metadata of known files is
+    refreshed while their loaded DataFrames are kept.
+    """
+    files = session_data["files"]
+    for file_id in [fid for fid in files if fid not in row.files]:
+        on_remove(files.pop(file_id))
+    for file_id, stored in row.files.items():
+        # Ignores keys no longer persisted (e.g. "ingesting" written by older versions)
+        meta = file_meta(stored)
+        if file_id in files:
+            for key, value in meta.items():
+                if key in VALIDATOR_KEYS:
+                    files[file_id].setdefault(key, value)
+                else:
+                    files[file_id][key] = value
+        elif os.path.exists(meta.get("path") or ""):
+            files[file_id] = {**meta, "df": None, "timestamp": os.path.getmtime(meta["path"])}
+    session_data["active_file_id"] = row.active_file_id if row.active_file_id in files else None
+    session_data["version"] = row.version
@@ -0,0 +1,134 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+# --- CONFIG ---
+SESSION_MEMORY_BUDGET_MB = int(os.getenv("SESSION_MEMORY_BUDGET_MB", "2048"))
+
+
+def estimate_memory(df) -> int:
+    """Deep memory footprint of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class SessionStore:
+    """Per-user session dicts with an LRU memory budget for the loaded DataFrames.
+
+    Sessions and file metadata (filename, path, source, timestamp, fingerprint) are
+    always kept. When the tracked DataFrames exceed the budget, the least recently
+    used file has its `df` dropped (and evict listeners called, e.g. to release its
+    agent) so the lazy-load path in /chat can rehydrate it later. Files pinned by an
+    in-flight request are never evicted.
+    """
+
+    def __init__(self, memory_budget_bytes: int):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._sessions: Dict[Any, Dict[str, Any]] = {}
+        # id(file_info) -> file_info, oldest first. Holding the dict keeps its id stable.
+        self._resident: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._pins: Dict[int, int] = {}
+        self._lock = threading.RLock()
+        self._evict_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.total_bytes = 0
+        self.session_hits = 0
+        self.session_misses = 0
+        self.df_hits = 0
+        self.df_misses = 0
+        self.evictions = 0
+
+    # --- SESSIONS ---
+    def get(self, user_id: Any) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is None:
+                self.session_misses += 1
+            else:
+                self.session_hits += 1
+            return session
+
+    def create(self, user_id: Any) -> Dict[str, Any]:
+        with self._lock:
+            session = self._sessions.setdefault(user_id, {"files": {}, "active_file_id": None})
+            return session
+
+    # --- DATAFRAMES ---
+    def record_access(self, file_info: Dict[str, Any]):
+        """Counts a hit (and bumps recency) if the file's DataFrame is resident, else a miss."""
+        with self._lock:
+            key = id(file_info)
+            if file_info.get("df") is not None and key in self._resident:
+                self._resident.move_to_end(key)
+                self.df_hits += 1
+            else:
+                self.df_misses += 1
+
+    def track(self, file_info: Dict[str, Any]):
+        """Records the (new) DataFrame held by `file_info` and evicts others to fit the budget."""
+        with self._lock:
+            key = id(file_info)
+            self.total_bytes -= file_info.get("mem_bytes", 0) if key in self._resident else 0
+            file_info["mem_bytes"] = estimate_memory(file_info["df"])
+            self.total_bytes += file_info["mem_bytes"]
+            self._resident[key] = file_info
+            self._resident.move_to_end(key)
+            self._evict(keep=key)
+
+    def forget(self, file_info: Dict[str, Any]):
+        """Stops tracking a file that was removed from its session."""
+        with self._lock:
+            if self._resident.pop(id(file_info), None) is not None:
+                self.total_bytes -= file_info.get("mem_bytes", 0)
+            file_info["mem_bytes"] = 0
+
+    def on_evict(self, listener: Callable[[Dict[str, Any]], None]):
+        """Registers `listener(file_info)`, called whenever a file's DataFrame is evicted."""
+        self._evict_listeners.append(listener)
+
+    @contextmanager
+    def pinned(self, file_info: Dict[str, Any]):
+        """Protects `file_info` from eviction while a request is using its DataFrame."""
+        key = id(file_info)
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield file_info
+        finally:
+            with self._lock:
+                self._pins[key] -= 1
+                if self._pins[key] <= 0:
+                    del self._pins[key]
+                self._evict()
+
+    def _evict(self, keep: Optional[int] = None):
+        for key in list(self._resident):
+            if self.total_bytes <= self.memory_budget_bytes:
+                break
+            if key == keep or key in self._pins:
+                continue
+            file_info = self._resident.pop(key)
+            self.total_bytes -= file_info.get("mem_bytes", 0)
+            print(f"🧹 Evicting {file_info.get('filename')} from memory ({file_info.get('mem_bytes', 0) // (1024 * 1024)} MB)")
+            file_info["df"] = None
+            file_info["mem_bytes"] = 0
+            self.evictions += 1
+            for listener in self._evict_listeners:
+                listener(file_info)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "resident_files": len(self._resident),
+                "resident_mb": round(self.total_bytes / (1024 * 1024), 1),
+                "budget_mb": round(self.memory_budget_bytes / (1024 * 1024), 1),
+                "session_hits": self.session_hits,
+                "session_misses": self.session_misses,
+                "df_hits": self.df_hits,
+                "df_misses": self.df_misses,
+                "evictions": self.evictions,
+            }
+
+
+session_store = SessionStore(SESSION_MEMORY_BUDGET_MB * 1024 * 1024)
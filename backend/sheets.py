@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import hashlib
+import html
+import os
+import re
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from backend.http_client import async_client, HTTP_BACKOFF, HTTP_RETRIES, RETRY_STATUSES
+
+# --- CONFIG ---
+SHEETS_MAX_TABS = int(os.getenv("SHEETS_MAX_TABS", "20"))
+SHEETS_PARALLEL_DOWNLOADS = int(os.getenv("SHEETS_PARALLEL_DOWNLOADS", "6"))
+SHEETS_META_TIMEOUT = float(os.getenv("SHEETS_META_TIMEOUT", "5"))
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+DEFAULT_TITLE = "Google Sheet Data"
+
+_TITLE_RE = re.compile(r"<title>(.*?)(?: - Google (?:Sheets|Drive))?</title>", re.S)
+# htmlview lists every tab, either as a JS item or as a sheet button
+_TAB_ITEM_RE = re.compile(r'name:\s*"((?:[^"\\]|\\.)*)"[^}]*?gid:\s*"(\d+)"')
+_TAB_BUTTON_RE = re.compile(r'id="sheet-button-(\d+)"[^>]*>\s*<a[^>]*>(.*?)</a>', re.S)
+
+
+class SheetError(Exception):
+    """A sheet could not be fetched; `status_code` is the HTTP status to answer with."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def parse_sheet_url(url: str) -> Optional[Tuple[str, Optional[str]]]:
+    """(spreadsheet id, gid or None) of a Google Sheets link, None for other URLs."""
+    if "docs.google.com/spreadsheets" not in url:
+        return None
+    match = re.search(r"/d/([a-zA-Z0-9-_]+)", url)
+    if not match:
+        raise SheetError(400, "Invalid Google Sheet URL")
+    gid_match = re.search(r"[#&?]gid=([0-9]+)", url)
+    return match.group(1), gid_match.group(1) if gid_match else None
+
+
+def export_url(sheet_id: str, gid: Optional[str]) -> str:
+    gid_param = f"&gid={gid}" if gid is not None else ""
+    return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv{gid_param}"
+
+
+def _parse_tabs(page: str) -> List[Dict[str, str]]:
+    tabs, seen = [], set()
+    for name, gid in _TAB_ITEM_RE.findall(page):
+        if gid not in seen:
+            seen.add(gid)
+            tabs.append({"gid": gid, "name": html.unescape(name.encode().decode("unicode_escape", "ignore"))})
+    for gid, name in _TAB_BUTTON_RE.findall(page):
+        if gid not in seen:
+            seen.add(gid)
+            tabs.append({"gid": gid, "name": html.unescape(re.sub(r"<[^>]+>", "", name)).strip()})
+    return tabs
+
+
+async def fetch_metadata(sheet_id: str) -> Dict[str, Any]:
+    """Spreadsheet title and tabs from its public HTML view; falls back to defaults on failure."""
+    meta = {"title": DEFAULT_TITLE, "tabs": []}
+    try:
+        res = await async_client().get(
+            f"https://docs.google.com/spreadsheets/d/{sheet_id}/htmlview",
+            timeout=SHEETS_META_TIMEOUT,
+        )
+        if res.status_code == 200:
+            title_match = _TITLE_RE.search(res.text)
+            if title_match and title_match.group(1).strip():
+                meta["title"] = html.unescape(title_match.group(1).strip())
+            meta["tabs"] = _parse_tabs(res.text)
+    except Exception as e:
+        print(f"Failed to fetch sheet title: {e}")
+    return meta
+
+
+async def download(url: str, semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, Any]:
+    """Streams `url` to a temp CSV, hashing it on the way, with backoff on 429/5xx and network errors.
+
+    Returns the temp path, the response headers and the content hash.
+    """
+    async with semaphore or contextlib.nullcontext():
+        for attempt in range(HTTP_RETRIES + 1):
+            try:
+                return await _download_once(url)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+                    raise
+            except httpx.TransportError:
+                if attempt == HTTP_RETRIES:
+                    raise
+            await asyncio.sleep(HTTP_BACKOFF * (2 ** attempt))
+
+
+async def _download_once(url: str) -> Dict[str, Any]:
+    async with async_client().stream("GET", url) as response:
+        response.raise_for_status()
+        if "text/html" in response.headers.get("Content-Type", ""):
+            raise SheetError(400, "❌ Permission Error: Sheet is private.")
+        digest = hashlib.sha256()
+        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".csv")
+        try:
+            with tmp:
+                async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_BYTES):
+                    tmp.write(chunk)
+                    digest.update(chunk)
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+        return {"path": tmp.name, "headers": response.headers, "hash": digest.hexdigest()}
+
+
+async def fetch_sheet(url: str, gids: Optional[List[str]] = None, all_tabs: bool = False) -> List[Dict[str, Any]]:
+    """Downloads the tabs of a sheet link (or a plain CSV URL) in parallel.
+
+    By default only the tab in the link is fetched; `gids` picks tabs explicitly and
+    `all_tabs` takes every tab listed in the spreadsheet. The title lookup runs
+    concurrently with the downloads except for `all_tabs`, which needs the tab list
+    first. Returns one {filename, url, path, headers, hash} per tab, in request order.
+    """
+    parsed = parse_sheet_url(url)
+    if parsed is None:
+        fetched = await download(url)
+        return [{"filename": f"{DEFAULT_TITLE}.csv", "url": url, **fetched}]
+
+    sheet_id, link_gid = parsed
+    meta_task = asyncio.create_task(fetch_metadata(sheet_id))
+    try:
+        if all_tabs:
+            meta = await meta_task
+            gids = [tab["gid"] for tab in meta["tabs"]] or [link_gid]
+        elif not gids:
+            gids = [link_gid]
+        gids = list(dict.fromkeys(gids))[:SHEETS_MAX_TABS]
+
+        semaphore = asyncio.Semaphore(SHEETS_PARALLEL_DOWNLOADS)
+        urls = [export_url(sheet_id, gid) for gid in gids]
+        results = await asyncio.gather(*(download(u, semaphore) for u in urls), return_exceptions=True)
+        meta = await meta_task
+    except BaseException:
+        meta_task.cancel()
+        raise
+
+    names = {tab["gid"]: tab["name"] for tab in meta["tabs"]}
+    tabs, failure = [], None
+    for gid, tab_url, result in zip(gids, urls, results):
+        if isinstance(result, BaseException):
+            failure = failure or result
+            continue
+        if len(gids) == 1:
+            filename = f"{meta['title']}.csv"
+        else:
+            filename = f"{meta['title']} - {names.get(gid) or f'gid {gid}'}.csv"
+        tabs.append({"filename": filename, "url": tab_url, "gid": gid, **result})
+    if failure is not None:
+        # All or nothing: a partial workbook would silently miss data
+        for tab in tabs:
+            os.remove(tab["path"])
+        raise failure
+    return tabs
@@ -0,0 +1,341 @@
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from backend.columnar import HAS_PYARROW, COLUMNAR_CACHE, columnar_path, is_fresh
+from backend.dataset_profile import infer_join_keys
+from backend.downsample import downsample_widget
+from backend.http_client import openai_client
+
+# --- CONFIG ---
+ANALYSIS_ENGINE = os.getenv("ANALYSIS_ENGINE", "pandas")  # "pandas" (pandasai agent) or "sql" (DuckDB)
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 4)))
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "2GB")
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR", os.path.join(tempfile.gettempdir(), "analytics_ai_cache", "duckdb"))
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "500"))
+SQL_TIMEOUT_SECONDS = float(os.getenv("SQL_TIMEOUT_SECONDS", "30"))
+SQL_MODEL = os.getenv("SQL_MODEL", "gpt-4o-mini")
+JOIN_MAX_ROWS = int(os.getenv("JOIN_MAX_ROWS", "50000000"))
+JOIN_SIZE_CACHE_ENTRIES = int(os.getenv("JOIN_SIZE_CACHE_ENTRIES", "1024"))
+
+# Bump whenever the SQL prompt changes so cached results are not reused
+SQL_PROMPT_VERSION = "2"
+TABLE_NAME = "data"
+
+try:
+    import duckdb
+    HAS_DUCKDB = True
+except ImportError:
+    HAS_DUCKDB = False
+
+if HAS_PYARROW:
+    import pyarrow.dataset as pa_dataset
+
+
+class SQLError(Exception):
+    pass
+
+
+def sql_enabled(engine: Optional[str] = None) -> bool:
+    return HAS_DUCKDB and (engine or ANALYSIS_ENGINE) == "sql"
+
+
+def can_scan_columnar(path: Optional[str]) -> bool:
+    """True if DuckDB can read the file straight from its Parquet copy, without loading a DataFrame."""
+    return bool(path) and COLUMNAR_CACHE and HAS_PYARROW and is_fresh(path)
+
+
+class SQLEngine:
+    """DuckDB execution backend for questions the LLM answers with SQL instead of pandas code.
+
+    Each query runs on its own cursor with the dataset registered as the `data` view:
+    the in-memory DataFrame when one is loaded, otherwise a lazy Arrow scan of the
+    Parquet copy, so files bigger than RAM are aggregated with DuckDB's multi-threaded,
+    spilling executor. File system access from SQL is disabled; generated queries can
+    only read the registered view.
+    """
+
+    def __init__(self):
+        self._db = None
+        self._lock = threading.Lock()
+        # (left fingerprint, left key, right fingerprint, right key) -> joined row count
+        self._join_sizes: "OrderedDict[Tuple[str, str, str, str], int]" = OrderedDict()
+        self.queries = 0
+        self.failures = 0
+        self.join_size_hits = 0
+        self.join_size_misses = 0
+
+    def _database(self):
+        with self._lock:
+            if self._db is None:
+                os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+                self._db = duckdb.connect(":memory:", config={
+                    "threads": DUCKDB_THREADS,
+                    "memory_limit": DUCKDB_MEMORY_LIMIT,
+                    "temp_directory": DUCKDB_TEMP_DIR,
+                })
+                # Set last: once disabled, the temp directory can't be configured any more
+                self._db.execute("SET enable_external_access = false")
+            return self._db
+
+    def cursor(self, tables: Dict[str, Dict[str, Any]]):
+        """A fresh connection with each file registered under its table name."""
+        cur = self._database().cursor()
+        for name, file_info in tables.items():
+            df = file_info.get("df")
+            if df is not None:
+                cur.register(name, df)
+            elif can_scan_columnar(file_info.get("path")):
+                cur.register(name, pa_dataset.dataset(columnar_path(file_info["path"]), format="parquet"))
+            else:
+                cur.close()
+                raise SQLError(f"{file_info.get('filename')} is not loaded")
+        return cur
+
+    def join_size(self, cur, left: str, left_key: str, right: str, right_key: str,
+                  fingerprints: Tuple[Optional[str], Optional[str]] = (None, None)) -> int:
+        """Exact row count of `left JOIN right ON left_key = right_key`, from per-key counts.
+
+        The two GROUP BY scans run once per pair of dataset versions; with both
+        `fingerprints` known, later questions on the same files reuse the count.
+        """
+        cache_key = (fingerprints[0], left_key, fingerprints[1], right_key) if all(fingerprints) else None
+        if cache_key is not None:
+            with self._lock:
+                if cache_key in self._join_sizes:
+                    self._join_sizes.move_to_end(cache_key)
+                    self.join_size_hits += 1
+                    return self._join_sizes[cache_key]
+                self.join_size_misses += 1
+        rows = self._count_join(cur, left, left_key, right, right_key)
+        if cache_key is not None:
+            with self._lock:
+                self._join_sizes[cache_key] = rows
+                while len(self._join_sizes) > JOIN_SIZE_CACHE_ENTRIES:
+                    self._join_sizes.popitem(last=False)
+        return rows
+
+    def _count_join(self, cur, left: str, left_key: str, right: str, right_key: str) -> int:
+        return int(cur.execute(f"""
+            SELECT COALESCE(SUM(l.n * r.n), 0)
+            FROM (SELECT {_quote(left_key)} AS k, COUNT(*) AS n FROM {left} GROUP BY 1) l
+            JOIN (SELECT {_quote(right_key)} AS k, COUNT(*) AS n FROM {right} GROUP BY 1) r ON l.k = r.k
+        """).fetchone()[0])
+
+    def check_joins(self, cur, sql: str, guarded: List[Dict[str, Any]]):
+        """Memory guard: rejects plans that hash-join two raw (unaggregated) inputs on a key
+        whose join would exceed JOIN_MAX_ROWS rows."""
+        plan = json.loads(cur.execute(f"EXPLAIN (FORMAT json) {sql}").fetchall()[0][1])
+        for node in _walk(plan):
+            conditions = node.get("extra_info", {}).get("Conditions", "")
+            if "JOIN" not in node["name"] or not conditions or not all(_is_raw(c) for c in node["children"]):
+                continue
+            for join in guarded:
+                pair = {join["left"], join["right"]}
+                if any({side.strip().strip('"') for side in c.split("=")} == pair
+                       for c in conditions.split("\n") if "=" in c):
+                    raise SQLError(
+                        f"Joining {join['left_table']} and {join['right_table']} on {join['left']} directly "
+                        f"would produce {join['rows']:,} rows. Aggregate each table by the key before joining."
+                    )
+
+    def execute(self, cur, sql: str, guarded: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+        """Runs one read-only SELECT, capped at SQL_MAX_ROWS rows and SQL_TIMEOUT_SECONDS."""
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise SQLError("Only a single SELECT statement is allowed")
+        if guarded:
+            try:
+                self.check_joins(cur, sql, guarded)
+            except duckdb.Error as e:
+                self.failures += 1
+                raise SQLError(str(e)) from e
+
+        timer = threading.Timer(SQL_TIMEOUT_SECONDS, cur.interrupt)
+        timer.start()
+        try:
+            self.queries += 1
+            result = cur.execute(f"SELECT * FROM ({sql.strip().rstrip(';')}) LIMIT {SQL_MAX_ROWS}")
+            return result.df()
+        except duckdb.Error as e:
+            self.failures += 1
+            raise SQLError(str(e)) from e
+        finally:
+            timer.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": HAS_DUCKDB, "engine": ANALYSIS_ENGINE, "queries": self.queries, "failures": self.failures,
+            "join_size_hits": self.join_size_hits, "join_size_misses": self.join_size_misses,
+        }
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _walk(nodes):
+    for node in nodes:
+        yield node
+        yield from _walk(node.get("children", []))
+
+
+def _is_raw(node) -> bool:
+    """True if a plan subtree reaches a table scan without passing through an aggregate."""
+    if "GROUP_BY" in node["name"] or "AGGREGATE" in node["name"]:
+        return False
+    if not node.get("children"):
+        return "SCAN" in node["name"]
+    return any(_is_raw(c) for c in node["children"])
+
+
+def table_names(file_infos: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """SQL-safe, unique table names derived from the file names ("Sales 2024.csv" -> sales_2024)."""
+    tables = {}
+    for file_info in file_infos:
+        stem = os.path.splitext(file_info.get("filename") or "data")[0]
+        name = re.sub(r"\W+", "_", stem).strip("_").lower() or "data"
+        if name[0].isdigit():
+            name = f"t_{name}"
+        candidate, n = name, 2
+        while candidate in tables:
+            candidate, n = f"{name}_{n}", n + 1
+        tables[candidate] = file_info
+    return tables
+
+
+sql_engine = SQLEngine()
+
+
+def build_sql_prompt(tables: List[Dict[str, Any]], context: str, joins: List[Dict[str, Any]]) -> str:
+    described = []
+    for table in tables:
+        columns = "\n".join(f"- {_quote(c['name'])} {c['type']}" for c in table["schema"])
+        described.append(f"Table `{table['name']}` ({table['rows']} rows) with columns:\n{columns}")
+    join_hints = ""
+    if joins:
+        lines = []
+        for j in joins:
+            line = (f"- {j['left_table']}.{_quote(j['left'])} = {j['right_table']}.{_quote(j['right'])}"
+                    f" ({j['relationship']}, {j['rows']:,} joined rows)")
+            if j["rows"] > JOIN_MAX_ROWS:
+                line += " TOO LARGE: aggregate each table by this key before joining"
+            lines.append(line)
+        join_hints = "\nJOIN KEYS:\n" + "\n".join(lines) + "\n"
+    first = tables[0]["name"]
+    tables_text = "\n".join(described)
+    return f"""You are an intelligent Data Analytics Engine that answers questions with DuckDB SQL.
+CONTEXT: {context}
+{tables_text}
+{join_hints}
+Answer with a JSON object {{"widgets": [...]}} where each widget is either
+- {{"vis_type": "kpi", "label": "...", "sql": "SELECT <single value> FROM {first} ..."}}
+- {{"vis_type": "chart", "type": "bar|line|pie|scatter", "title": "...", "sql": "SELECT <x>, <y> FROM {first} ..."}}
+
+RULES:
+1. ALWAYS PREFER VISUALIZATION over simple text; add a kpi when a single headline number helps.
+2. Chart queries return exactly two columns, x first, aggregated and ordered (at most {SQL_MAX_ROWS} rows).
+3. Quote column names with double quotes. Only SELECT from the tables above.
+"""
+
+
+def generate_widget_specs(query: str, prompt: str, error: Optional[str] = None) -> List[Dict[str, Any]]:
+    messages = [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": query},
+    ]
+    if error:
+        messages.append({"role": "user", "content": f"The previous SQL failed with: {error}. Fix it."})
+    res = openai_client().chat.completions.create(
+        model=SQL_MODEL,
+        messages=messages,
+        temperature=0,
+        response_format={"type": "json_object"},
+    )
+    specs = json.loads(res.choices[0].message.content).get("widgets", [])
+    return [s for s in specs if isinstance(s, dict) and s.get("sql")]
+
+
+def _to_widget(spec: Dict[str, Any], frame: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    if frame.empty or len(frame.columns) == 0:
+        return None
+    if spec.get("vis_type") == "kpi":
+        value = frame.iat[0, 0]
+        return {"vis_type": "kpi", "payload": {"label": spec.get("label") or frame.columns[0], "value": value}}
+    if len(frame.columns) < 2:
+        return None
+    x_key, y_key = frame.columns[0], frame.columns[1]
+    return downsample_widget({
+        "vis_type": "chart",
+        "payload": {
+            "type": str(spec.get("type") or "bar").lower(),
+            "title": spec.get("title") or f"{y_key} by {x_key}",
+            "x_key": x_key,
+            "y_key": y_key,
+            "data": frame[[x_key, y_key]].to_dict(orient="records"),
+        },
+    })
+
+
+def _answer(tables: Dict[str, Dict[str, Any]], profiles: List[Dict[str, Any]], query: str) -> Dict[str, Any]:
+    cur = sql_engine.cursor(tables)
+    try:
+        described = [
+            {"name": name, "rows": profile.get("rows", "unknown"),
+             "schema": [{"name": r[0], "type": r[1]} for r in cur.execute(f"DESCRIBE {name}").fetchall()]}
+            for name, profile in zip(tables, profiles)
+        ]
+        joins = []
+        names = list(tables)
+        for i, left in enumerate(names):
+            for j in range(i + 1, len(names)):
+                right = names[j]
+                fingerprints = (profiles[i].get("fingerprint"), profiles[j].get("fingerprint"))
+                for key in infer_join_keys(profiles[i], profiles[j]):
+                    rows = sql_engine.join_size(cur, left, key["left"], right, key["right"], fingerprints)
+                    joins.append(dict(key, left_table=left, right_table=right, rows=rows))
+        guarded = [j for j in joins if j["rows"] > JOIN_MAX_ROWS]
+        context = " ".join(dict.fromkeys(p.get("domain_context", "") for p in profiles))
+        prompt = build_sql_prompt(described, context, joins)
+
+        error = None
+        for _ in range(2):
+            specs = generate_widget_specs(query, prompt, error)
+            try:
+                widgets = [_to_widget(spec, sql_engine.execute(cur, spec["sql"], guarded)) for spec in specs]
+                break
+            except SQLError as e:
+                print(f"⚠️ Generated SQL failed: {e}")
+                error = str(e)
+        else:
+            return {"type": "text", "payload": f"Analysis failed: {error}"}
+    finally:
+        cur.close()
+
+    widgets = [w for w in widgets if w is not None]
+    if not widgets:
+        return {"type": "text", "payload": "The query returned no data."}
+    print(f"✅ Returning {len(widgets)} widgets from SQL")
+    return {"type": "dashboard", "payload": widgets}
+
+
+def answer_with_sql(file_info: Dict[str, Any], query: str, profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Asks the LLM for SQL, runs it on DuckDB and maps the results onto kpi/chart widgets.
+
+    A failing query is sent back to the LLM once with its error message.
+    """
+    return _answer({TABLE_NAME: file_info}, [profile], query)
+
+
+def answer_across_files(file_infos: List[Dict[str, Any]], query: str, profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Like answer_with_sql, over several files at once: each file is its own table, and
+    join keys inferred from the profiles (with their exact joined row counts) are given
+    to the LLM. DuckDB executes the joins as hash joins; joins of raw tables on a key
+    that would exceed JOIN_MAX_ROWS rows are rejected (see SQLEngine.check_joins)."""
+    return _answer(table_names(file_infos), profiles, query)
@@ -0,0 +1,99 @@
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from backend.http_client import http_session, HTTP_CONNECT_TIMEOUT
+
+# --- CONFIG ---
+URL_REFRESH_TTL = float(os.getenv("URL_REFRESH_TTL", "60"))
+URL_REFRESH_TIMEOUT = float(os.getenv("URL_REFRESH_TIMEOUT", "30"))
+URL_REFRESH_WORKERS = int(os.getenv("URL_REFRESH_WORKERS", "2"))
+
+_executor = ThreadPoolExecutor(max_workers=URL_REFRESH_WORKERS, thread_name_prefix="url-refresh")
+_in_flight = set()
+_lock = threading.Lock()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def remember_fetch(file_info: Dict[str, Any], headers, digest: str):
+    """Stores the validators of a successful fetch so the next check can be conditional."""
+    file_info["etag"] = headers.get("ETag")
+    file_info["last_modified"] = headers.get("Last-Modified")
+    file_info["content_hash"] = digest
+    file_info["last_checked"] = time.time()
+
+
+def is_due(file_info: Dict[str, Any]) -> bool:
+    return time.time() - file_info.get("last_checked", 0) >= URL_REFRESH_TTL
+
+
+def fetch_if_changed(file_info: Dict[str, Any]) -> Optional[Tuple[bytes, Any, str]]:
+    """Conditionally re-downloads a URL source.
+
+    Returns (body, response headers, content hash) of new content, or None if unchanged.
+    New content is not remembered here: the caller does that once it has been applied.
+    """
+    headers = {}
+    if file_info.get("etag"):
+        headers["If-None-Match"] = file_info["etag"]
+    if file_info.get("last_modified"):
+        headers["If-Modified-Since"] = file_info["last_modified"]
+
+    res = http_session().get(file_info["url"], headers=headers, timeout=(HTTP_CONNECT_TIMEOUT, URL_REFRESH_TIMEOUT))
+    if res.status_code == 304:
+        file_info["last_checked"] = time.time()
+        return None
+    res.raise_for_status()
+
+    # Google Sheets exports rarely send validators, so compare the bytes as well
+    digest = content_hash(res.content)
+    if digest == file_info.get("content_hash"):
+        remember_fetch(file_info, res.headers, digest)
+        return None
+    return res.content, res.headers, digest
+
+
+def schedule(file_info: Dict[str, Any], apply_fn: Callable[[Dict[str, Any], bytes], None]) -> bool:
+    """Starts a background refresh of `file_info` if its TTL expired and none is running.
+
+    `apply_fn(file_info, body)` is only called when the content actually changed. The new
+    validators and hash are recorded once it succeeds, so content that failed to parse
+    is fetched and retried on the next check instead of passing as unchanged.
+    """
+    if not file_info.get("url") or not is_due(file_info):
+        return False
+    key = id(file_info)
+    with _lock:
+        if key in _in_flight:
+            return False
+        _in_flight.add(key)
+
+    def run():
+        try:
+            fetched = fetch_if_changed(file_info)
+            if fetched is not None:
+                body, headers, digest = fetched
+                apply_fn(file_info, body)
+                remember_fetch(file_info, headers, digest)
+            else:
+                print(f"   -> {file_info.get('filename')} unchanged at source")
+        except Exception as e:
+            print(f"Warning: Auto-refresh failed: {e}")
+            # Back off for a full TTL instead of retrying on every question
+            file_info["last_checked"] = time.time()
+        finally:
+            with _lock:
+                _in_flight.discard(key)
+
+    _executor.submit(run)
+    return True
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,102 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+
+# --- CONFIG ---
+ANALYSIS_MAX_WORKERS = int(os.getenv("ANALYSIS_MAX_WORKERS", "8"))
+ANALYSIS_MAX_QUEUE = int(os.getenv("ANALYSIS_MAX_QUEUE", "16"))
+ANALYSIS_MAX_PER_USER = int(os.getenv("ANALYSIS_MAX_PER_USER", "2"))
+ANALYSIS_RETRY_AFTER = os.getenv("ANALYSIS_RETRY_AFTER", "5")
+
+
+class WorkerPool:
+    """Runs blocking work (LLM calls, file reloads) off the event loop with admission control.
+
+    A request is admitted only if the user is below `max_per_user` in-flight jobs and the
+    pool has fewer than `max_workers + max_queue` jobs running or waiting. Anything beyond
+    that is rejected immediately (429 per user, 503 globally) instead of queueing forever.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, max_per_user: int, name: str = "analysis"):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.max_per_user = max_per_user
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._per_user: Dict[Any, int] = {}
+        self.completed = 0
+        self.rejected_user = 0
+        self.rejected_global = 0
+
+    def _acquire(self, user_id: Any):
+        with self._lock:
+            if self._per_user.get(user_id, 0) >= self.max_per_user:
+                self.rejected_user += 1
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many analyses running for this session. Please wait for one to finish.",
+                    headers={"Retry-After": ANALYSIS_RETRY_AFTER},
+                )
+            if self._in_flight >= self.capacity:
+                self.rejected_global += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Analysis engine is busy. Please try again shortly.",
+                    headers={"Retry-After": ANALYSIS_RETRY_AFTER},
+                )
+            self._in_flight += 1
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+    def _release(self, user_id: Any):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed += 1
+            remaining = self._per_user.get(user_id, 1) - 1
+            if remaining <= 0:
+                self._per_user.pop(user_id, None)
+            else:
+                self._per_user[user_id] = remaining
+
+    def start(self, user_id: Any, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """Admits the job for `user_id` (raising 429/503 right away) and returns an awaitable.
+
+        The slot is released when the worker thread finishes, even if the awaiting
+        request was cancelled in the meantime.
+        """
+        self._acquire(user_id)
+        try:
+            job = self._executor.submit(functools.partial(fn, *args, **kwargs))
+        except Exception:
+            self._release(user_id)
+            raise
+        job.add_done_callback(lambda _: self._release(user_id))
+        return asyncio.wrap_future(job)
+
+    async def run(self, user_id: Any, fn: Callable, *args, **kwargs):
+        """Admits the job for `user_id` and awaits `fn(*args, **kwargs)` on a worker thread."""
+        return await self.start(user_id, fn, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "capacity": self.capacity,
+                "in_flight": self._in_flight,
+                "active_users": len(self._per_user),
+                "completed": self.completed,
+                "rejected_user": self.rejected_user,
+                "rejected_global": self.rejected_global,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+analysis_pool = WorkerPool(ANALYSIS_MAX_WORKERS, ANALYSIS_MAX_QUEUE, ANALYSIS_MAX_PER_USER)
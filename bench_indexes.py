@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from backend.database import ensure_indexes, make_engine
+from backend import models
+
+SIZES = (10_000, 100_000, 1_000_000)
+USERS = 1_000
+REPEAT = 200
+
+QUERIES = {
+    # get_dashboard
+    "dashboard": (
+        "SELECT * FROM widget WHERE user_id = ? ORDER BY created_at DESC",
+        "ix_widget_user_id_created_at",
+    ),
+    # get_user_session
+    "session restore": (
+        "SELECT * FROM analysissession WHERE user_id = ?",
+        "ix_analysissession_user_id_file_path",
+    ),
+    # delete_file
+    "delete by path": (
+        "SELECT * FROM analysissession WHERE user_id = ? AND file_path = ?",
+        "ix_analysissession_user_id_file_path",
+    ),
+}
+NEW_INDEXES = {index for _, index in QUERIES.values()}
+
+
+def seed(path: str, rows: int):
+    """A database as created before the composite indexes existed, with `rows` per table."""
+    engine = make_engine(f"sqlite:///{path}")
+    # The metadata the models registered their tables in
+    models.SQLModel.metadata.create_all(engine)
+    engine.dispose()
+    con = sqlite3.connect(path)
+    for index in NEW_INDEXES:
+        con.execute(f"DROP INDEX {index}")
+    start = datetime(2025, 1, 1)
+    con.executemany(
+        "INSERT INTO widget (user_id, title, vis_type, payload, created_at) VALUES (?, ?, 'kpi', '{}', ?)",
+        ((i % USERS, f"w{i}", start + timedelta(seconds=i)) for i in range(rows)),
+    )
+    con.executemany(
+        "INSERT INTO analysissession (user_id, file_path, file_name, created_at) VALUES (?, ?, ?, ?)",
+        ((i % USERS, f"/tmp/upload_{i}.csv", f"upload_{i}.csv", start) for i in range(rows)),
+    )
+    con.commit()
+    con.close()
+
+
+def params(name: str):
+    return (7, "/tmp/upload_7.csv") if name == "delete by path" else (7,)
+
+
+def measure(path: str):
+    # A fresh connection, so it sees the schema after the migration
+    con = sqlite3.connect(path)
+    results = {}
+    for name, (sql, _) in QUERIES.items():
+        plan = " | ".join(row[-1] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}", params(name)))
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            con.execute(sql, params(name)).fetchall()
+        results[name] = ((time.perf_counter() - start) / REPEAT * 1000, plan)
+    con.close()
+    return results
+
+
+def main():
+    for rows in SIZES:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            seed(path, rows)
+            before = measure(path)
+
+            # The migration that runs at startup
+            engine = make_engine(f"sqlite:///{path}")
+            ensure_indexes(engine)
+            engine.dispose()
+            after = measure(path)
+
+        print(f"\n{rows:,} rows per table")
+        for name, (sql, index) in QUERIES.items():
+            ms_before, plan_before = before[name]
+            ms_after, plan_after = after[name]
+            print(f"  {name:<16} {ms_before:8.3f} ms -> {ms_after:7.3f} ms   {plan_after}")
+            assert f"USING INDEX {index}" in plan_after, f"{name} is not index-backed: {plan_after}"
+            assert "TEMP B-TREE" not in plan_after, f"{name} sorts outside the index: {plan_after}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backend.sanitize import sanitize_dataframe
+
+ROWS = 1_000_000
+
+
+def legacy_sanitize_dataframe(df):
+    """The pre-rewrite sanitizer, kept here as the baseline."""
+    df.columns = [str(c).strip() for c in df.columns]
+    for col in df.columns:
+        if "date" in col.lower() or "time" in col.lower():
+            try:
+                df[col] = pd.to_datetime(df[col])
+            except:
+                pass
+    df = df.replace([np.inf, -np.inf], np.nan)
+    df = df.where(pd.notnull(df), None)
+    for col in df.columns:
+        if pd.api.types.is_float_dtype(df[col]):
+            df[col] = df[col].astype(object).where(pd.notnull(df[col]), None)
+    return df
+
+
+def make_frame(rows: int) -> pd.DataFrame:
+    """A stall_data.csv-shaped frame with some NaN/inf sprinkled in."""
+    rng = np.random.default_rng(0)
+    dates = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D")
+    sales = rng.normal(300, 100, rows)
+    sales[rng.integers(0, rows, rows // 100)] = np.nan
+    profit = rng.normal(50, 20, rows)
+    profit[rng.integers(0, rows, rows // 1000)] = np.inf
+    return pd.DataFrame({
+        " Date ": dates.strftime("%Y-%m-%d"),
+        "Product": rng.choice(["Office Chair", "Gaming Monitor", "Ergonomic Desk", "Wireless Mouse"], rows),
+        "Category": rng.choice(["Furniture", "Electronics", "Accessories"], rows),
+        "Sales": sales,
+        "Profit": profit,
+        "Region": rng.choice(["North", "South", "East", "West"], rows),
+    })
+
+
+def measure(fn, rows: int):
+    df = make_frame(rows)
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = fn(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    resident = out.memory_usage(deep=True).sum()
+    return elapsed, peak, resident, out
+
+
+if __name__ == "__main__":
+    print(f"Sanitizing {ROWS:,} rows x 6 columns\n")
+    print(f"{'implementation':<12} {'time (s)':>10} {'peak alloc (MB)':>16} {'result size (MB)':>17}")
+    results = {}
+    for name, fn in [("legacy", legacy_sanitize_dataframe), ("current", sanitize_dataframe)]:
+        elapsed, peak, resident, out = measure(fn, ROWS)
+        results[name] = out
+        print(f"{name:<12} {elapsed:>10.2f} {peak / 2**20:>16.1f} {resident / 2**20:>17.1f}")
+
+    print("\nResulting dtypes (current):")
+    print(results["current"].dtypes.to_string())
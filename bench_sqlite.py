@@ -0,0 +1,91 @@
+import os
+import tempfile
+import threading
+import time
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from backend.database import make_engine
+from backend.models import User, Widget
+
+DURATION = 5.0
+READERS = 8
+WRITERS = 2
+USERS = 50
+SEED_WIDGETS = 20_000
+
+
+def legacy_engine(url: str):
+    """The pre-tuning engine: default rollback journal and pool."""
+    return create_engine(url, connect_args={"check_same_thread": False})
+
+
+def seed(engine):
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        for i in range(USERS):
+            session.add(User(email=f"user{i}@example.com", password_hash="x"))
+        session.commit()
+        for i in range(SEED_WIDGETS):
+            session.add(Widget(user_id=1 + i % USERS, title=f"w{i}", vis_type="kpi", payload={"value": i}))
+        session.commit()
+
+
+def run(engine):
+    """Dashboard-style reads alongside save-widget writes; returns ops/s and errors per side."""
+    stop = time.perf_counter() + DURATION
+    counts = {"reads": 0, "writes": 0, "read_errors": 0, "write_errors": 0}
+    lock = threading.Lock()
+
+    def reader(n):
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                with Session(engine) as session:
+                    session.exec(select(Widget).where(Widget.user_id == 1 + n % USERS)).all()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["reads"] += done
+            counts["read_errors"] += errors
+
+    def writer(n):
+        done = errors = 0
+        while time.perf_counter() < stop:
+            try:
+                with Session(engine) as session:
+                    session.add(Widget(user_id=1 + n % USERS, title="new", vis_type="chart", payload={"data": [1, 2, 3]}))
+                    session.commit()
+                done += 1
+            except Exception:
+                errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["write_errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(WRITERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {k: (v / DURATION if k in ("reads", "writes") else v) for k, v in counts.items()}
+
+
+def main():
+    print(f"{READERS} readers + {WRITERS} writers for {DURATION:.0f}s over {SEED_WIDGETS:,} widgets")
+    for label, factory in (("legacy", legacy_engine), ("tuned", make_engine)):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = factory(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+            seed(engine)
+            result = run(engine)
+            engine.dispose()
+        print(
+            f"{label:>7}: {result['reads']:8.0f} reads/s  {result['writes']:7.0f} writes/s"
+            f"  (errors: {result['read_errors']} read, {result['write_errors']} write)"
+        )
+
+
+if __name__ == "__main__":
+    main()
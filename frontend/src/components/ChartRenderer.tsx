@@ -22,12 +22,13 @@ type ChartData = {
     x_key?: string;
     y_key?: string;
     data: any[];
+    original_points?: number;
 };
 
 export default function ChartRenderer({ data }: { data: ChartData }) {
     if (!data || !data.data) return null;
 
-    const { type, title, data: chartData, x_key, y_key } = data;
+    const { type, title, data: chartData, x_key, y_key, original_points } = data;
 
     // Check if keys exist, otherwise infer them
     let xKey = x_key || "label";
@@ -187,6 +188,11 @@ export default function ChartRenderer({ data }: { data: ChartData }) {
     return (
         <div className="w-full h-full min-h-[300px] bg-brand-card/30 p-4 rounded-[24px] border border-brand-border shadow-sm backdrop-blur-sm flex flex-col">
             {title && <h3 className="text-lg font-semibold mb-4 text-center text-brand-text-primary">{title}</h3>}
+            {original_points && Array.isArray(chartData) && (
+                <p className="text-xs -mt-3 mb-2 text-center text-gray-500">
+                    Showing {chartData.length} of {original_points.toLocaleString()} points
+                </p>
+            )}
             <div className="flex-1 w-full min-h-0">
                 <ResponsiveContainer width="100%" height="100%">
                     {renderChart()}
@@ -2,8 +2,8 @@
 
 import { useState, useEffect, useRef } from "react";
 import Image from "next/image";
-import { chat, getFiles, uploadFile, connectUrl, deleteFile } from "@/lib/api";
-import { Send, User, Loader2, ChevronRight, FileText, Plus, X, UploadCloud, Link as LinkIcon, CheckCircle2, Trash2 } from "lucide-react";
+import { chatStream, ChatStreamError, ChatStreamEvent, getFiles, uploadFile, connectUrl, deleteFile } from "@/lib/api";
+import { Send, Square, User, Loader2, ChevronRight, FileText, Plus, X, UploadCloud, Link as LinkIcon, CheckCircle2, Trash2 } from "lucide-react";
 import { motion, AnimatePresence } from "framer-motion";
 import { Input } from "@/components/ui/input";
 import { Button } from "@/components/ui/button";
@@ -24,6 +24,17 @@ type Message = {
     widgets?: Widget[];
 };
 
+// Loader text for the progress events of /chat/stream
+const PROGRESS_TEXT: Record<string, string> = {
+    dataset_loaded: "Querying dataset...",
+    agent_ready: "Calculating insights...",
+    code_executed: "Rendering visualization...",
+    executing: "Calculating insights...",
+    fast_path: "Rendering visualization...",
+    cache_hit: "Rendering visualization...",
+    coalesced: "Rendering visualization...",
+};
+
 interface FileItem {
     id: string;
     filename: string;
@@ -39,27 +50,16 @@ export default function ChatInterface({ isConnected = false }: { isConnected?: b
 
     // Ref for auto-scrolling to latest message
     const messagesEndRef = useRef<HTMLDivElement>(null);
+    // Aborts the in-flight /chat/stream request (Stop button, new question or unmount)
+    const abortRef = useRef<AbortController | null>(null);
+
+    useEffect(() => () => abortRef.current?.abort(), []);
 
     // Auto-scroll to bottom when messages change
     useEffect(() => {
         messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
     }, [messages, loading]);
 
-    useEffect(() => {
-        let interval: NodeJS.Timeout;
-        if (loading) {
-            const steps = ["Analyzing request...", "Querying dataset...", "Calculating insights...", "Rendering visualization..."];
-            let i = 0;
-            interval = setInterval(() => {
-                setLoadingText(steps[i % steps.length]);
-                i++;
-            }, 2500);
-        } else {
-            setLoadingText("Analyzing request...");
-        }
-        return () => clearInterval(interval);
-    }, [loading]);
-
     // Sidebar State
     const [sidebarOpen, setSidebarOpen] = useState(true); // Default Open for visibility
     const [files, setFiles] = useState<FileItem[]>([]);
@@ -158,48 +158,77 @@ export default function ChatInterface({ isConnected = false }: { isConnected?: b
     const handleSend = async () => {
         if (!query.trim()) return;
 
+        abortRef.current?.abort();
+        const controller = new AbortController();
+        abortRef.current = controller;
+
         const userMessage: Message = { role: "user", content: query };
         setMessages((prev) => [...prev, userMessage]);
         setQuery("");
         setLoading(true);
-
-        try {
-            const data = await chat(userMessage.content, selectedFileId || undefined);
-
-            let assistantMessage: Message;
-            let content = "";
-            let widgets: Widget[] = [];
-
-            if (data.type === "dashboard" || data.type === "widget") {
-                content = "Here is the analysis:";
-                widgets = data.payload || [];
-            } else if (data.type === "text") {
-                content = data.payload || "Analysis complete.";
+        setLoadingText("Analyzing request...");
+
+        // The answer is added on its first widget/text event and grows as widgets arrive
+        let answered = false;
+        const showAnswer = (update: (msg: Message) => Message) => {
+            if (!answered) {
+                answered = true;
+                setMessages((prev) => [...prev, update({ role: "assistant", content: "", widgets: [] })]);
             } else {
-                content = typeof data.payload === 'string' ? data.payload : JSON.stringify(data.payload);
+                setMessages((prev) => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
             }
+        };
+
+        const onEvent = ({ event, data }: ChatStreamEvent) => {
+            if (event === "widget") {
+                showAnswer((msg) => ({
+                    ...msg,
+                    content: "Here is the analysis:",
+                    widgets: [...(msg.widgets || []), data.widget]
+                }));
+            } else if (event === "text" || event === "error") {
+                const payload = data?.payload;
+                const content = typeof payload === 'string' ? payload : JSON.stringify(payload);
+                showAnswer((msg) => ({ ...msg, content: content || "Analysis complete." }));
+            } else if (PROGRESS_TEXT[event]) {
+                setLoadingText(PROGRESS_TEXT[event]);
+            }
+        };
 
-            assistantMessage = {
-                role: "assistant",
-                content,
-                widgets
-            };
-
-            setMessages((prev) => [...prev, assistantMessage]);
+        try {
+            await chatStream(userMessage.content, onEvent, selectedFileId || undefined, controller.signal);
+            if (!answered) showAnswer((msg) => ({ ...msg, content: "Analysis complete." }));
         } catch (error) {
+            if (controller.signal.aborted) {
+                // Only for the Stop button; a newer question replacing this one needs no note
+                if (!answered && abortRef.current === controller) {
+                    setMessages((prev) => [...prev, { role: "assistant", content: "Request cancelled." }]);
+                }
+                return;
+            }
             console.error("Chat error:", error);
             setMessages((prev) => [
                 ...prev,
                 {
                     role: "assistant",
-                    content: "Sorry, there was an error processing your request."
+                    content: error instanceof ChatStreamError && error.status === 409
+                        ? error.message
+                        : "Sorry, there was an error processing your request."
                 }
             ]);
         } finally {
-            setLoading(false);
+            // A newer question owns the loader once it has replaced this controller
+            if (abortRef.current === controller) {
+                abortRef.current = null;
+                setLoading(false);
+            }
         }
     };
 
+    const handleStop = () => {
+        abortRef.current?.abort();
+    };
+
     const handleKeyPress = (e: React.KeyboardEvent) => {
         if (e.key === "Enter" && !e.shiftKey) {
             e.preventDefault();
@@ -470,14 +499,24 @@ export default function ChatInterface({ isConnected = false }: { isConnected?: b
                             disabled={!selectedFileId}
                             className="flex-1 h-11 bg-slate-50 border-slate-200 focus-visible:ring-2 focus-visible:ring-brand-primary/20 focus-visible:border-brand-primary text-slate-900 placeholder:text-slate-400 rounded-xl"
                         />
-                        <Button
-                            onClick={handleSend}
-                            disabled={loading || !query.trim()}
-                            className="bg-gradient-ai hover:opacity-90 text-white font-semibold rounded-xl transition-all shadow-premium hover:shadow-premium-lg h-11 px-5 disabled:opacity-50 disabled:cursor-not-allowed flex items-center gap-2"
-                        >
-                            <Send className="w-4 h-4" />
-                            Send
-                        </Button>
+                        {loading ? (
+                            <Button
+                                onClick={handleStop}
+                                className="bg-slate-700 hover:bg-slate-800 text-white font-semibold rounded-xl transition-all shadow-premium h-11 px-5 flex items-center gap-2"
+                            >
+                                <Square className="w-4 h-4" />
+                                Stop
+                            </Button>
+                        ) : (
+                            <Button
+                                onClick={handleSend}
+                                disabled={!query.trim()}
+                                className="bg-gradient-ai hover:opacity-90 text-white font-semibold rounded-xl transition-all shadow-premium hover:shadow-premium-lg h-11 px-5 disabled:opacity-50 disabled:cursor-not-allowed flex items-center gap-2"
+                            >
+                                <Send className="w-4 h-4" />
+                                Send
+                            </Button>
+                        )}
                     </div>
                 </div>
             </div>
@@ -32,8 +32,61 @@ export const chat = async (query: string, fileId?: string) => {
     return response.data;
 };
 
-export const connectUrl = async (url: string) => {
-    const response = await api.post('/connect_url', { url });
+export type ChatStreamEvent = { event: string; data: any };
+
+export class ChatStreamError extends Error {
+    constructor(message: string, public status: number) {
+        super(message);
+    }
+}
+
+// Streams /chat/stream Server-Sent Events; abort the signal to cancel an abandoned request
+export const chatStream = async (
+    query: string,
+    onEvent: (evt: ChatStreamEvent) => void,
+    fileId?: string,
+    signal?: AbortSignal
+) => {
+    const response = await fetch(`${api.defaults.baseURL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Session-ID': getSessionId(),
+        },
+        body: JSON.stringify({ query, file_id: fileId }),
+        signal,
+    });
+    if (!response.ok || !response.body) {
+        // e.g. 409 while the file is still loading, 429 when the user has too many requests in flight
+        const body = await response.json().catch(() => null);
+        throw new ChatStreamError(body?.detail || `Chat stream failed with status ${response.status}`, response.status);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            onEvent({ event, data: data ? JSON.parse(data) : null });
+        }
+    }
+};
+
+export const connectUrl = async (url: string, options: { gids?: string[]; allTabs?: boolean } = {}) => {
+    const response = await api.post('/connect_url', { url, gids: options.gids, all_tabs: options.allTabs ?? false });
     return response.data;
 };
 